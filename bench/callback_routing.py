@@ -0,0 +1,103 @@
+"""Стоимость маршрутизации нажатия кнопки в зависимости от числа обработчиков.
+
+Сравнивает прежнюю схему (строковые callback_data и цепочки фильтров
+F.data.startswith в нескольких роутерах) с подписанным кодеком и таблицей
+действий из handlers/callbacks.py. Обновления подаются в Dispatcher.feed_update
+без сети; нажимается кнопка последнего зарегистрированного обработчика,
+то есть худший случай для перебора фильтров. Запуск из корня проекта:
+
+    python -m bench.callback_routing --handlers 10 50 200 --iterations 2000
+"""
+import argparse
+import asyncio
+import time
+import timeit
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+from handlers.callbacks import CallbackCodec, CallbackDispatcher
+
+ROUTERS = 5
+USER = User(id=1, is_bot=False, first_name="bench")
+MESSAGE = Message(message_id=1, date=0, chat=Chat(id=1, type="private"))
+
+
+async def noop(callback: CallbackQuery, *values: int) -> None:
+    pass
+
+
+def legacy_dispatcher(handlers: int) -> Dispatcher:
+    """Обработчики F.data.startswith("actN_"), разложенные по ROUTERS роутерам"""
+    dp = Dispatcher()
+    routers = [Router() for _ in range(ROUTERS)]
+    for index in range(handlers):
+        routers[index % ROUTERS].callback_query(F.data.startswith(f"act{index}_"))(noop)
+    for router in routers:
+        dp.include_router(router)
+    return dp
+
+
+def table_dispatcher(handlers: int):
+    """Один обработчик и таблица действий на handlers кодов"""
+    codec = CallbackCodec(b"bench")
+    table = CallbackDispatcher(codec)
+    actions = [codec.action(index, f"act{index}", "BBB") for index in range(handlers)]
+    for action in actions:
+        table.on(action)(noop)
+    dp = Dispatcher()
+    router = Router()
+    router.callback_query()(table.dispatch)
+    dp.include_router(router)
+    return dp, actions[-1]
+
+
+def update(data: str) -> Update:
+    return Update(update_id=1, callback_query=CallbackQuery(
+        id="1", from_user=USER, chat_instance="1", message=MESSAGE, data=data
+    ))
+
+
+async def measure(dp: Dispatcher, bot: Bot, event: Update, iterations: int) -> float:
+    """Микросекунд на одно обновление"""
+    for _ in range(100):
+        await dp.feed_update(bot, event)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await dp.feed_update(bot, event)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--handlers", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    bot = Bot("123456:bench")
+    print(f"{'обработчиков':>12} {'фильтры, мкс':>14} {'таблица, мкс':>14}")
+    for handlers in args.handlers:
+        last = handlers - 1
+        legacy = await measure(
+            legacy_dispatcher(handlers), bot, update(f"act{last}_1_2_3"), args.iterations
+        )
+        dp, action = table_dispatcher(handlers)
+        table = await measure(dp, bot, update(action.pack(1, 2, 3)), args.iterations)
+        print(f"{handlers:>12} {legacy:>14.1f} {table:>14.1f}")
+    await bot.session.close()
+
+    # Стоимость отказа: подделанное поле (счет теста) и мусор вместо данных
+    codec = CallbackCodec(b"bench")
+    action = codec.action(1, "test_start", "BBB")
+    valid = action.pack(1, 2, 0)
+    raw = bytearray(valid.encode())
+    raw[6] = ord("B") if raw[6] != ord("B") else ord("C")
+    forged = raw.decode()
+    for name, data in (("верные", valid), ("подделанные", forged), ("мусор", "sub_1_2_3")):
+        seconds = timeit.timeit(lambda: codec.decode(data), number=100_000)
+        accepted = codec.decode(data) is not None
+        print(f"decode {name:<12} {seconds * 10:.2f} мкс ({'принято' if accepted else 'отклонено'})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,290 @@
+"""Локальный заменитель Telegram Bot API для нагрузочных прогонов.
+
+Хранит сообщения чатов в памяти и реализует методы, которыми пользуется бот:
+getMe, getUpdates, setWebhook/deleteWebhook, sendMessage, sendPhoto,
+editMessageText, editMessageMedia, deleteMessage, answerCallbackQuery.
+Ошибки повторяют настоящие (message is not modified, нет текста для правки
+и т.п.), остальные методы отвечают ok. Обновления пользователей кладутся в
+очередь getUpdates, а если бот вызвал setWebhook - отправляются на webhook.
+
+Используется нагрузочным генератором bench/load.py.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import ClientSession, web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "WiresharkBot", "username": "wireshark_bot"}
+
+# Методы, которые меняют то, что видит пользователь
+VISIBLE_METHODS = {"sendMessage", "sendPhoto", "editMessageText", "editMessageMedia", "deleteMessage"}
+SERVICE_METHODS = {"getMe", "getUpdates", "setWebhook", "deleteWebhook", "close", "logOut"}
+
+
+class BotApiError(Exception):
+    def __init__(self, code: int, description: str, retry_after: Optional[int] = None) -> None:
+        super().__init__(description)
+        self.code = code
+        self.description = description
+        self.retry_after = retry_after
+
+
+class FakeBotAPI:
+    """Bot API в памяти. on_call(method, chat_id, params, result) вызывается
+    после каждого успешного запроса бота - так нагрузочный генератор видит ответы."""
+
+    def __init__(self, latency: float = 0.0, flood_rate: float = 0.0) -> None:
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.on_call: Optional[Callable[[str, Optional[int], dict, Any], None]] = None
+        self.chats: Dict[int, Dict[int, dict]] = {}
+        self.webhook_url = ""
+        self.webhook_secret = ""
+        self._message_ids: Dict[int, itertools.count] = {}
+        self._update_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._callback_chats: Dict[str, int] = {}
+        self._updates: List[dict] = []
+        self._new_updates = asyncio.Event()
+        self._client: Optional[ClientSession] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._random = random.Random(0)
+
+    # --- сервер ---
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> str:
+        """Запускает сервер, возвращает базовый адрес для TELEGRAM_API_URL"""
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = {}
+        files = {}
+        for key, value in (await request.post()).items():
+            if isinstance(value, web.FileField):
+                files[key] = value.file.read()
+            else:
+                params[key] = value
+        if self.latency and method not in SERVICE_METHODS:
+            await asyncio.sleep(self.latency)
+        self.calls[method] += 1
+        try:
+            if (self.flood_rate and method not in SERVICE_METHODS
+                    and self._random.random() < self.flood_rate):
+                raise BotApiError(429, "Too Many Requests: retry after 1", retry_after=1)
+            handler = getattr(self, f"_api_{method}", None)
+            result = await handler(params, files) if handler else True
+        except BotApiError as e:
+            self.errors[method] += 1
+            body = {"ok": False, "error_code": e.code, "description": e.description}
+            if e.retry_after:
+                body["parameters"] = {"retry_after": e.retry_after}
+            return web.json_response(body, status=e.code)
+        if self.on_call is not None:
+            self.on_call(method, self._chat_of(method, params), params, result)
+        return web.json_response({"ok": True, "result": result})
+
+    def _chat_of(self, method: str, params: dict) -> Optional[int]:
+        if method == "answerCallbackQuery":
+            return self._callback_chats.pop(params.get("callback_query_id"), None)
+        chat_id = params.get("chat_id")
+        return int(chat_id) if chat_id and chat_id.lstrip("-").isdigit() else None
+
+    # --- сообщения ---
+
+    def _next_message_id(self, chat_id: int) -> int:
+        counter = self._message_ids.setdefault(chat_id, itertools.count(1))
+        return next(counter)
+
+    def _store(self, chat_id: int, message: dict) -> dict:
+        self.chats.setdefault(chat_id, {})[message["message_id"]] = message
+        return message
+
+    def _bot_message(self, chat_id: int, **fields) -> dict:
+        message = {
+            "message_id": self._next_message_id(chat_id),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": f"user{chat_id}"},
+            "from": BOT_USER,
+        }
+        message.update({key: value for key, value in fields.items() if value is not None})
+        return self._store(chat_id, message)
+
+    def _find(self, params: dict) -> dict:
+        chat_id = int(params["chat_id"])
+        message = self.chats.get(chat_id, {}).get(int(params["message_id"]))
+        if message is None:
+            raise BotApiError(400, "Bad Request: message to edit not found")
+        return message
+
+    def _photo(self, media: str, files: dict) -> List[dict]:
+        if media.startswith("attach://"):
+            media = media[len("attach://"):]
+        if media in files:
+            file_id = f"photo-{next(self._file_ids)}-{len(files[media])}"
+        else:
+            file_id = media
+        return [{"file_id": file_id, "file_unique_id": file_id, "width": 1280, "height": 720}]
+
+    @staticmethod
+    def _markup(params: dict) -> Optional[dict]:
+        """Inline-клавиатура из запроса (только она возвращается в Message.reply_markup)"""
+        markup = json.loads(params["reply_markup"]) if params.get("reply_markup") else None
+        return markup if markup and "inline_keyboard" in markup else None
+
+    # --- методы Bot API ---
+
+    async def _api_getMe(self, params: dict, files: dict) -> dict:
+        return BOT_USER
+
+    async def _api_setWebhook(self, params: dict, files: dict) -> bool:
+        self.webhook_url = params.get("url", "")
+        self.webhook_secret = params.get("secret_token", "")
+        return True
+
+    async def _api_deleteWebhook(self, params: dict, files: dict) -> bool:
+        self.webhook_url = self.webhook_secret = ""
+        return True
+
+    async def _api_getUpdates(self, params: dict, files: dict) -> List[dict]:
+        offset = int(params.get("offset", 0) or 0)
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(
+                    self._new_updates.wait(), timeout=float(params.get("timeout", 0) or 0)
+                )
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get("limit", 100) or 100)
+        return self._updates[:limit]
+
+    async def _api_sendMessage(self, params: dict, files: dict) -> dict:
+        return self._bot_message(
+            int(params["chat_id"]), text=params["text"], reply_markup=self._markup(params)
+        )
+
+    async def _api_sendPhoto(self, params: dict, files: dict) -> dict:
+        return self._bot_message(
+            int(params["chat_id"]),
+            photo=self._photo(params["photo"], files),
+            caption=params.get("caption"),
+            reply_markup=self._markup(params)
+        )
+
+    async def _api_editMessageText(self, params: dict, files: dict) -> dict:
+        message = self._find(params)
+        if "text" not in message:
+            raise BotApiError(400, "Bad Request: there is no text in the message to edit")
+        markup = self._markup(params)
+        if message["text"] == params["text"] and message.get("reply_markup") == markup:
+            raise BotApiError(400, "Bad Request: message is not modified")
+        message.update(text=params["text"], reply_markup=markup, edit_date=int(time.time()))
+        return message
+
+    async def _api_editMessageMedia(self, params: dict, files: dict) -> dict:
+        message = self._find(params)
+        if "photo" not in message:
+            raise BotApiError(400, "Bad Request: there is no media in the message to edit")
+        media = json.loads(params["media"])
+        photo = self._photo(media["media"], files)
+        markup = self._markup(params)
+        if (message["photo"][0]["file_id"] == photo[0]["file_id"]
+                and message.get("caption") == media.get("caption")
+                and message.get("reply_markup") == markup):
+            raise BotApiError(400, "Bad Request: message is not modified")
+        message.update(
+            photo=photo, caption=media.get("caption"), reply_markup=markup,
+            edit_date=int(time.time())
+        )
+        return message
+
+    async def _api_deleteMessage(self, params: dict, files: dict) -> bool:
+        chat = self.chats.get(int(params["chat_id"]), {})
+        if chat.pop(int(params["message_id"]), None) is None:
+            raise BotApiError(400, "Bad Request: message to delete not found")
+        return True
+
+    # --- обновления от пользователей ---
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "language_code": "ru"}
+
+    async def _deliver(self, update: dict) -> None:
+        if self.webhook_url:
+            if self._client is None:
+                self._client = ClientSession()
+            headers = {}
+            if self.webhook_secret:
+                headers["X-Telegram-Bot-Api-Secret-Token"] = self.webhook_secret
+            async with self._client.post(self.webhook_url, json=update, headers=headers) as resp:
+                if resp.status != 200:
+                    self.errors["webhook"] += 1
+        else:
+            self._updates.append(update)
+            self._new_updates.set()
+
+    async def send_text(self, user_id: int, text: str) -> dict:
+        """Пользователь пишет боту текст (например, кнопку reply-клавиатуры)"""
+        message = self._store(user_id, {
+            "message_id": self._next_message_id(user_id),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": f"user{user_id}"},
+            "from": self._user(user_id),
+            "text": text,
+        })
+        if text.startswith("/"):
+            command = text.split()[0]
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        update = {"update_id": next(self._update_ids), "message": message}
+        await self._deliver(update)
+        return update
+
+    async def press(self, user_id: int, message: dict, data: str) -> dict:
+        """Пользователь нажимает inline-кнопку с callback_data под сообщением"""
+        query_id = f"{user_id}-{next(self._update_ids)}"
+        self._callback_chats[query_id] = user_id
+        update = {
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": query_id,
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "message": message,
+                "data": data,
+            },
+        }
+        await self._deliver(update)
+        return update
+
+    def last_keyboard_message(self, user_id: int) -> Optional[dict]:
+        """Последнее сообщение бота с inline-клавиатурой в чате пользователя"""
+        for message in sorted(self.chats.get(user_id, {}).values(),
+                              key=lambda m: m["message_id"], reverse=True):
+            markup = message.get("reply_markup") or {}
+            if message.get("from", {}).get("is_bot") and markup.get("inline_keyboard"):
+                return message
+        return None
+
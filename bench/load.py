@@ -0,0 +1,278 @@
+"""Сквозной нагрузочный прогон: бот + локальный Bot API + виртуальные пользователи.
+
+Бот работает в этом же процессе (long polling к bench/fake_bot_api.py) с
+настоящими роутерами, базой во временном каталоге и планировщиком исходящих
+запросов. Каждый виртуальный пользователь нажимает кнопки, которые видит:
+проходит страницы теории, тест целиком и меню практики. В конце печатаются
+p50/p95/p99 времени от отправки обновления до конца его обработки ботом,
+число вызовов Bot API и записей в базу на одно обновление. Запуск из корня
+проекта:
+
+    python -m bench.load --users 50 --seconds 30
+    python -m bench.load --users 200 --seconds 60 --think 0.5 --no-outbound
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import aiosqlite
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+import data.database as database
+from bench.fake_bot_api import SERVICE_METHODS, FakeBotAPI
+from handlers.callbacks import codec
+from services.media import media_cache
+from services.outbound import outbound
+
+
+class ResponseTracker:
+    """Отмечает завершение обработки каждого обновления (outer-middleware
+    диспетчера), чтобы пользователь дождался ответа на свое нажатие"""
+
+    def __init__(self) -> None:
+        self._done: Dict[int, asyncio.Future] = {}
+
+    def expect(self, update_id: int) -> asyncio.Future:
+        return self._done.setdefault(update_id, asyncio.get_running_loop().create_future())
+
+    async def middleware(self, handler, event, data):
+        try:
+            return await handler(event, data)
+        finally:
+            future = self.expect(event.update_id)
+            if not future.done():
+                future.set_result(time.perf_counter())
+
+    async def wait(self, update_id: int, timeout: float) -> Optional[float]:
+        """Время (perf_counter) завершения обработки обновления или None по таймауту"""
+        try:
+            return await asyncio.wait_for(asyncio.shield(self.expect(update_id)), timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._done.pop(update_id, None)
+
+
+class VirtualUser:
+    def __init__(self, user_id: int, api: FakeBotAPI, tracker: ResponseTracker,
+                 report: "Report", think: float, timeout: float) -> None:
+        self.user_id = user_id
+        self.api = api
+        self.tracker = tracker
+        self.report = report
+        self.think = think
+        self.timeout = timeout
+        self.random = random.Random(user_id)
+
+    async def _step(self, action) -> bool:
+        """Выполняет действие пользователя и ждет, пока бот обработает обновление"""
+        started = time.perf_counter()
+        update = await action
+        self.report.updates += 1
+        answered = await self.tracker.wait(update["update_id"], self.timeout)
+        if answered is None:
+            self.report.timeouts += 1
+            return False
+        self.report.latencies.append(answered - started)
+        if self.think:
+            await asyncio.sleep(self.random.uniform(self.think * 0.5, self.think * 1.5))
+        return True
+
+    def _buttons(self, match: Callable[[str, str], bool]) -> List[str]:
+        """callback_data кнопок последнего сообщения, для которых match(текст, действие)"""
+        message = self.api.last_keyboard_message(self.user_id)
+        if message is None:
+            return []
+        found = []
+        for row in message["reply_markup"]["inline_keyboard"]:
+            for button in row:
+                decoded = codec.decode(button.get("callback_data"))
+                if decoded and match(button["text"], decoded[0].name):
+                    found.append(button["callback_data"])
+        return found
+
+    async def say(self, text: str) -> bool:
+        return await self._step(self.api.send_text(self.user_id, text))
+
+    async def press(self, match: Callable[[str, str], bool], pick_random: bool = True) -> bool:
+        buttons = self._buttons(match)
+        if not buttons:
+            return False
+        data = self.random.choice(buttons) if pick_random else buttons[0]
+        message = self.api.last_keyboard_message(self.user_id)
+        return await self._step(self.api.press(self.user_id, message, data))
+
+    async def theory(self) -> None:
+        """Модуль -> раздел -> все страницы по кнопке "Далее" -> обратно к модулям"""
+        if not await self.say("📚 Теория"):
+            return
+        if not await self.press(lambda text, action: action == "module"):
+            return
+        if not await self.press(lambda text, action: action == "page"):
+            return
+        for _ in range(20):
+            if not await self.press(lambda text, action: text.startswith("Далее")):
+                break
+        await self.press(lambda text, action: action == "module")
+        await self.press(lambda text, action: action == "back_to_modules")
+
+    async def test(self) -> None:
+        """Выбор теста -> старт -> ответы на все вопросы -> к списку тестов"""
+        if not await self.say("📝 Тесты"):
+            return
+        if not await self.press(lambda text, action: action == "test_select"):
+            return
+        if not await self.press(lambda text, action: action == "test_start"):
+            return
+        for _ in range(50):
+            if not await self.press(lambda text, action: action == "test_answer"):
+                break
+        await self.press(lambda text, action: action == "back_to_tests")
+
+    async def practice(self) -> None:
+        """Меню практики -> модуль -> задание -> назад"""
+        if not await self.say("🔍 Практика"):
+            return
+        if not await self.press(lambda text, action: action in ("practice_module", "practice_locked")):
+            return
+        if await self.press(lambda text, action: action == "practice_task"):
+            await self.press(lambda text, action: action == "practice_module")
+        await self.press(lambda text, action: action == "practice_back")
+
+    async def run(self, deadline: float) -> None:
+        await self.say("/start")
+        flows = [self.theory, self.test, self.practice]
+        while time.perf_counter() < deadline:
+            await self.random.choice(flows)()
+
+
+class Report:
+    def __init__(self) -> None:
+        self.updates = 0
+        self.timeouts = 0
+        self.latencies: List[float] = []
+
+
+class DbCounter:
+    """Счетчик фиксаций транзакций (commit) всех соединений aiosqlite"""
+
+    def __init__(self) -> None:
+        self.commits = 0
+        self._original = aiosqlite.Connection.commit
+
+    def __enter__(self) -> "DbCounter":
+        counter, original = self, self._original
+
+        async def commit(connection):
+            counter.commits += 1
+            return await original(connection)
+
+        aiosqlite.Connection.commit = commit
+        return self
+
+    def __exit__(self, *exc) -> None:
+        aiosqlite.Connection.commit = self._original
+
+
+def rows_written() -> int:
+    """Строк, измененных соединениями пулов (включая триггеры агрегатов)"""
+    return sum(
+        connection.total_changes
+        for pool in database._pools for connection in pool._connections
+    )
+
+
+def percentile(values: List[float], q: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50, help="виртуальных пользователей")
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--think", type=float, default=1.0, help="пауза между нажатиями, с")
+    parser.add_argument("--timeout", type=float, default=10.0, help="ожидание ответа бота, с")
+    parser.add_argument("--port", type=int, default=8081, help="порт локального Bot API")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка Bot API, с")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--no-outbound", action="store_true",
+                        help="без планировщика исходящих запросов")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    from main import build_dispatcher
+
+    api = FakeBotAPI(latency=args.api_latency, flood_rate=args.flood_rate)
+    tracker = ResponseTracker()
+    base_url = await api.start(port=args.port)
+
+    with tempfile.TemporaryDirectory() as tmp, DbCounter() as db_counter:
+        database.DATABASE_PATH = Path(tmp) / "load.db"
+        await database.init_db()
+        await database.open_pool()
+        await database.start_write_buffer()
+        await media_cache.load()
+
+        bot = Bot("123456:load", session=AiohttpSession(api=TelegramAPIServer.from_base(base_url)))
+        if not args.no_outbound:
+            bot.session.middleware(outbound)
+        dp = build_dispatcher()
+        dp.update.outer_middleware(tracker.middleware)
+        polling = asyncio.create_task(
+            dp.start_polling(bot, handle_signals=False, polling_timeout=1)
+        )
+
+        report = Report()
+        commits_before, rows_before = db_counter.commits, rows_written()
+        api.calls.clear()
+        started = time.perf_counter()
+        deadline = started + args.seconds
+        users = [
+            VirtualUser(100_000 + i, api, tracker, report, args.think, args.timeout)
+            for i in range(args.users)
+        ]
+        await asyncio.gather(*(user.run(deadline) for user in users))
+        elapsed = time.perf_counter() - started
+
+        # Дописываем отложенные записи, чтобы учесть их в счетчиках
+        await database.stop_write_buffer()
+        commits = db_counter.commits - commits_before
+        rows = rows_written() - rows_before
+
+        await dp.stop_polling()
+        await polling
+        await bot.session.close()
+        await database.close_pool()
+    await api.stop()
+
+    calls = Counter({m: n for m, n in api.calls.items() if m not in SERVICE_METHODS})
+    updates = max(report.updates, 1)
+    latencies = sorted(report.latencies)
+    print(f"Пользователей: {args.users}, {elapsed:.1f} с, обновлений: {report.updates} "
+          f"({report.updates / elapsed:.1f}/с), без ответа: {report.timeouts}")
+    print("Время обработки обновления, мс: " + ", ".join(
+        f"p{q} {percentile(latencies, q) * 1000:.1f}" for q in (50, 95, 99)
+    ))
+    print(f"Вызовов Bot API на обновление: {sum(calls.values()) / updates:.2f} "
+          f"({', '.join(f'{m} {n}' for m, n in calls.most_common())})")
+    if api.errors:
+        print(f"Ошибок Bot API: {dict(api.errors)}")
+    print(f"Записей в базу на обновление: {commits / updates:.2f} транзакций, "
+          f"{rows / updates:.2f} строк")
+    if not args.no_outbound:
+        print(f"Планировщик: {outbound.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""Нагрузочное сравнение чтения прогресса: до и после перехода на пул и UPSERT.
+
+Запуск из корня проекта:
+    python -m bench.progress_reads --users 5000 --workers 50 --seconds 5
+"""
+import argparse
+import asyncio
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+import aiosqlite
+
+import data.database as database
+
+
+async def legacy_get_user_progress(user_id: int) -> dict:
+    """Старый путь чтения: новое соединение на вызов и INSERT для незнакомого пользователя"""
+    async with aiosqlite.connect(database.DATABASE_PATH) as db:
+        cursor = await db.execute(
+            "SELECT current_module, current_submodule, current_page, completed_mask, last_active "
+            "FROM user_progress WHERE user_id = ?",
+            (user_id,)
+        )
+        row = await cursor.fetchone()
+        if not row:
+            await db.execute("INSERT INTO user_progress (user_id) VALUES (?)", (user_id,))
+            await db.commit()
+            return database._default_progress()
+        return {'completed_modules': database.mask_to_modules(row[3])}
+
+
+async def seed(users: int) -> None:
+    async with aiosqlite.connect(database.DATABASE_PATH) as db:
+        await db.executemany(
+            "INSERT INTO user_progress (user_id, current_module, completed_mask) VALUES (?, ?, ?)",
+            [(user_id, user_id % 5 + 1, user_id % 32) for user_id in range(users)]
+        )
+        await db.commit()
+
+
+async def run(read, users: int, workers: int, seconds: float) -> tuple:
+    """Возвращает (чтений в секунду, число ошибок); половина запросов -
+    по незнакомым пользователям"""
+    deadline = time.perf_counter() + seconds
+    counts = [0] * workers
+    errors = [0] * workers
+
+    async def worker(index: int) -> None:
+        rnd = random.Random(index)
+        while time.perf_counter() < deadline:
+            try:
+                await read(rnd.randrange(users * 2))
+                counts[index] += 1
+            except sqlite3.Error:
+                # Гонка INSERT-при-чтении и "database is locked" у старого пути
+                errors[index] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(workers)))
+    return sum(counts) / (time.perf_counter() - started), sum(errors)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE_PATH = Path(tmp) / "bench.db"
+        await database.init_db()
+        await seed(args.users)
+
+        results = {}
+        results["до: соединение на вызов + INSERT"] = await run(
+            legacy_get_user_progress, args.users, args.workers, args.seconds
+        )
+
+        # Возвращаем базу к исходному набору пользователей
+        async with aiosqlite.connect(database.DATABASE_PATH) as db:
+            await db.execute("DELETE FROM user_progress WHERE user_id >= ?", (args.users,))
+            await db.commit()
+
+        await database.open_pool()
+        database.configure_progress_cache(maxsize=0)
+        results["после: пул, без кэша"] = await run(
+            database.get_user_progress, args.users, args.workers, args.seconds
+        )
+        database.configure_progress_cache(maxsize=args.users * 2)
+        results["после: пул + кэш"] = await run(
+            database.get_user_progress, args.users, args.workers, args.seconds
+        )
+        await database.close_pool()
+
+    print(f"Пользователей: {args.users}, конкурентных читателей: {args.workers}")
+    for name, (rate, errors) in results.items():
+        print(f"{name:<36} {rate:>12,.0f} чтений/с   ошибок: {errors}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
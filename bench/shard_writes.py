@@ -0,0 +1,57 @@
+"""Пропускная способность конкурентной записи прогресса в зависимости от числа шардов.
+
+Запуск из корня проекта:
+    python -m bench.shard_writes --shards 1 2 4 --workers 64 --seconds 5
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import data.database as database
+
+
+async def run(shards: int, workers: int, seconds: float, tmp: Path) -> float:
+    """Возвращает число зафиксированных записей в секунду"""
+    database.DATABASE_PATH = tmp / f"bench_{shards}.db"
+    database.SHARD_COUNT = shards
+    await database.init_db()
+    await database.open_pool()
+
+    deadline = time.perf_counter() + seconds
+    counts = [0] * workers
+
+    async def worker(index: int) -> None:
+        rnd = random.Random(index)
+        while time.perf_counter() < deadline:
+            # Каждая запись - отдельная транзакция, как у завершения модуля
+            await database.update_user_progress(
+                rnd.randrange(100_000), module=rnd.randint(1, 5), mark_completed=True
+            )
+            counts[index] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(workers)))
+    rate = sum(counts) / (time.perf_counter() - started)
+    await database.close_pool()
+    return rate
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    database.configure_progress_cache(maxsize=0)
+    with tempfile.TemporaryDirectory() as tmp:
+        for shards in args.shards:
+            rate = await run(shards, args.workers, args.seconds, Path(tmp))
+            print(f"шардов: {shards:<3} {rate:>10,.0f} записей/с")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Бот
+BOT_TOKEN = os.getenv("BOT_TOKEN", "your_token")
+# Адрес Bot API (пусто - api.telegram.org); например, локальный тестовый сервер
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+# Ключ подписи callback_data кнопок (пусто - производный от BOT_TOKEN).
+# При смене ключа кнопки в уже отправленных сообщениях перестают работать
+CALLBACK_SECRET = os.getenv("CALLBACK_SECRET", "")
+# Режим получения обновлений: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+
+# Webhook: публичный адрес (без пути), секрет для X-Telegram-Bot-Api-Secret-Token
+# и адрес, на котором слушает HTTP-сервер бота
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+
+# Хранилище прогресса
+# Число файлов-шардов SQLite. Меняется только на пустой базе:
+# пользователи распределяются по шардам как user_id % DB_SHARDS
+DB_SHARDS = int(os.getenv("DB_SHARDS", "1"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+# Состояния FSM (сессии тестов): ключей в памяти и время жизни без изменений, ч
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "100000"))
+FSM_TTL_HOURS = float(os.getenv("FSM_TTL_HOURS", "24"))
+
+# Резервное копирование (выключено, если BACKUP_DIR не задан)
+BACKUP_DIR = os.getenv("BACKUP_DIR", "")
+BACKUP_INTERVAL_HOURS = float(os.getenv("BACKUP_INTERVAL_HOURS", "24"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+BACKUP_COMPRESS = os.getenv("BACKUP_COMPRESS", "0") == "1"
+
+# Администраторы бота (user_id через запятую): доступ к /stats и другим служебным командам
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x}
+
+# Служебный чат для предварительной загрузки картинок курса при старте (0 - выключено)
+MEDIA_PREWARM_CHAT_ID = int(os.getenv("MEDIA_PREWARM_CHAT_ID", "0"))
+
+# Период проверки файлов content/ на изменения, с (0 - без перезагрузки на лету)
+CONTENT_RELOAD_INTERVAL = float(os.getenv("CONTENT_RELOAD_INTERVAL", "2"))
+
+# Входящие обновления: одновременно выполняемых обработчиков на весь бот,
+# длина очереди одного чата и окно схлопывания повторных нажатий кнопки, с
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "64"))
+UPDATE_CHAT_QUEUE = int(os.getenv("UPDATE_CHAT_QUEUE", "10"))
+UPDATE_DUPLICATE_WINDOW = float(os.getenv("UPDATE_DUPLICATE_WINDOW", "1"))
+
+# Исходящие запросы к Bot API: общий лимит (сообщений/с), лимит на один чат
+# и число повторов после 429. Значения чуть ниже лимитов Telegram
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "28"))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+
+# Рассылки: скорость (сообщений/с, ниже OUTBOUND_GLOBAL_RATE, чтобы оставался
+# запас для интерактивных ответов) и число одновременных запросов
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))
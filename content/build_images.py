@@ -0,0 +1,148 @@
+"""Сборка картинок курса для отправки в Telegram.
+
+Для каждой картинки из TEXTS: вписывает ее в лимиты фото Telegram, пробует
+несколько кодировок (PNG без потерь, JPEG) и оставляет самую компактную.
+Результат пишется в images/build/ под именем по хэшу содержимого вместе с
+manifest.json, который читает services/media.py. Неизмененные исходники
+(по sha256) повторно не обрабатываются.
+
+Требует Pillow: pip install -r requirements-build.txt. Запуск из корня проекта:
+    python -m content.build_images [--force]
+"""
+import argparse
+import hashlib
+import io
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Tuple
+
+from content.texts import TEXTS
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow нужен только для сборки
+    Image = None
+
+IMAGES_DIR = Path(__file__).parent.parent / "images"
+BUILD_DIR = IMAGES_DIR / "build"
+MANIFEST_PATH = BUILD_DIR / "manifest.json"
+
+# Telegram сам уменьшает фото до 1280 px по большей стороне; кроме того,
+# сумма сторон не больше 10000 и соотношение сторон не больше 20
+MAX_SIDE = 1280
+MAX_SIDES_SUM = 10000
+MAX_RATIO = 20
+JPEG_QUALITY = 85
+
+
+def sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def load_manifest() -> Dict[str, dict]:
+    if MANIFEST_PATH.exists():
+        return json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    return {}
+
+
+def fit_to_limits(image):
+    """Уменьшает картинку под лимиты фото Telegram (без увеличения)"""
+    width, height = image.size
+    if max(width, height) / max(1, min(width, height)) > MAX_RATIO:
+        raise ValueError(f"соотношение сторон {width}x{height} больше {MAX_RATIO}")
+    scale = min(1.0, MAX_SIDE / max(width, height), MAX_SIDES_SUM / (width + height))
+    if scale < 1.0:
+        image = image.resize(
+            (max(1, round(width * scale)), max(1, round(height * scale))),
+            Image.LANCZOS
+        )
+    return image
+
+
+def flatten(image):
+    """Убирает альфа-канал (фото в Telegram непрозрачны), подложка белая"""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def encode_smallest(image) -> Tuple[str, bytes]:
+    """Возвращает (расширение, байты) самой компактной из допустимых кодировок"""
+    candidates = []
+
+    png = io.BytesIO()
+    image.save(png, format="PNG", optimize=True)
+    candidates.append(("png", png.getvalue()))
+
+    jpeg = io.BytesIO()
+    image.save(jpeg, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    candidates.append(("jpg", jpeg.getvalue()))
+
+    return min(candidates, key=lambda candidate: len(candidate[1]))
+
+
+def build_image(source: str, source_hash: str) -> dict:
+    with Image.open(IMAGES_DIR / source) as original:
+        image = flatten(fit_to_limits(original))
+    extension, data = encode_smallest(image)
+    output = f"{hashlib.sha256(data).hexdigest()[:16]}.{extension}"
+    (BUILD_DIR / output).write_bytes(data)
+    return {
+        "source_hash": source_hash,
+        "output": output,
+        "width": image.width,
+        "height": image.height,
+        "bytes": len(data),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сборка картинок курса для Telegram")
+    parser.add_argument("--force", action="store_true", help="пересобрать все картинки")
+    args = parser.parse_args()
+
+    if Image is None:
+        sys.exit("Для сборки картинок нужен Pillow: pip install Pillow")
+
+    BUILD_DIR.mkdir(parents=True, exist_ok=True)
+    manifest = {} if args.force else load_manifest()
+    sources = sorted({page['image'] for page in TEXTS.values() if page.get('image')})
+
+    result, built, before, after = {}, 0, 0, 0
+    for source in sources:
+        path = IMAGES_DIR / source
+        if not path.exists():
+            print(f"! нет файла {source}", file=sys.stderr)
+            continue
+        source_hash = sha256(path)
+        entry = manifest.get(source)
+        if not (entry and entry["source_hash"] == source_hash
+                and (BUILD_DIR / entry["output"]).exists()):
+            entry = build_image(source, source_hash)
+            built += 1
+            print(f"{source}: {path.stat().st_size} -> {entry['bytes']} байт ({entry['output']})")
+        result[source] = entry
+        before += path.stat().st_size
+        after += entry["bytes"]
+
+    # Удаляем сборки, на которые больше не ссылается манифест
+    used = {entry["output"] for entry in result.values()}
+    for stale in BUILD_DIR.iterdir():
+        if stale.name != MANIFEST_PATH.name and stale.name not in used:
+            stale.unlink()
+
+    MANIFEST_PATH.write_text(
+        json.dumps(result, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8"
+    )
+    print(
+        f"Картинок: {len(result)}, пересобрано: {built}; "
+        f"{before / 1024:.0f} КБ -> {after / 1024:.0f} КБ"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+"""Скомпилированный индекс содержимого курса.
+
+modules.py, texts.py, questions.py и practice_tasks.py остаются исходниками в
+виде словарей, а бот читает только индекс: build_index() проверяет их
+перекрестные ссылки и собирает неизменяемые объекты (frozen, __slots__), где
+номера модуля, раздела, страницы, вопроса и задания - позиции в кортежах:
+
+    index.modules[module_id - 1].submodules[submodule_id - 1].pages[page - 1]
+
+Ошибки в содержимом (ContentError) останавливают запуск бота. Недописанные
+страницы в пределах 'pages' раздела - только предупреждения: на их месте
+заглушка "в разработке".
+
+Исходники импортируются только при сборке индекса. Текущий индекс - одна
+ссылка (_index); производные кэши (register_derived: клавиатуры и т.п.)
+хранятся в самом индексе и строятся при первом обращении, а при перезагрузке
+содержимого - заранее, до publish(). Новый индекс подменяет старый одним
+присваиванием, поэтому обработчики никогда не видят собранный наполовину.
+
+Проверка без запуска бота, из корня проекта:
+    python -m content.index
+"""
+import importlib
+import importlib.util
+import logging
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_DIR = Path(__file__).parent
+IMAGES_DIR = CONTENT_DIR.parent / "images"
+
+# Исходник -> (файл в content/, переменная в нем)
+SOURCES = {
+    'modules': ("modules.py", "MODULES"),
+    'texts': ("texts.py", "TEXTS"),
+    'questions': ("questions.py", "QUESTIONS"),
+    'tasks': ("practice_tasks.py", "PRACTICE_TASKS"),
+}
+
+# Номера модулей, разделов, страниц, вопросов и ответов передаются в
+# callback_data однобайтовыми полями
+MAX_NUMBER = 255
+
+
+class ContentError(Exception):
+    """Содержимое курса не проходит проверку"""
+
+    def __init__(self, errors: List[str]) -> None:
+        super().__init__("Ошибки в содержимом курса:\n" + "\n".join(f"- {e}" for e in errors))
+        self.errors = errors
+
+
+@dataclass(frozen=True, slots=True)
+class Page:
+    text: str
+    image: Optional[str] = None
+    placeholder: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class Submodule:
+    id: int
+    title: str
+    description: str
+    pages: Tuple[Page, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class Module:
+    id: int
+    title: str
+    description: str
+    submodules: Tuple[Submodule, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class Question:
+    text: str
+    options: Tuple[str, ...]
+    correct: int
+    explanation: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class Task:
+    title: str
+    description: str
+    check: str
+    resources: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True, slots=True)
+class ContentIndex:
+    modules: Tuple[Module, ...]
+    # Вопросы и задания по позиции модуля; пустой кортеж - нет теста/заданий
+    questions: Tuple[Tuple[Question, ...], ...]
+    tasks: Tuple[Tuple[Task, ...], ...]
+    warnings: Tuple[str, ...] = ()
+    # Производные кэши по имени; заполняются до публикации индекса
+    derived: Dict[str, Any] = field(default_factory=dict, compare=False, repr=False)
+
+    def module(self, module_id: int) -> Optional[Module]:
+        if 0 < module_id <= len(self.modules):
+            return self.modules[module_id - 1]
+        return None
+
+    def submodule(self, module_id: int, submodule_id: int) -> Optional[Submodule]:
+        module = self.module(module_id)
+        if module is not None and 0 < submodule_id <= len(module.submodules):
+            return module.submodules[submodule_id - 1]
+        return None
+
+    def page(self, module_id: int, submodule_id: int, page: int) -> Optional[Page]:
+        submodule = self.submodule(module_id, submodule_id)
+        if submodule is not None and 0 < page <= len(submodule.pages):
+            return submodule.pages[page - 1]
+        return None
+
+    def module_questions(self, module_id: int) -> Tuple[Question, ...]:
+        return self.questions[module_id - 1] if 0 < module_id <= len(self.questions) else ()
+
+    def module_tasks(self, module_id: int) -> Tuple[Task, ...]:
+        return self.tasks[module_id - 1] if 0 < module_id <= len(self.tasks) else ()
+
+
+def placeholder_page(module_id: int, submodule_id: int, page: int) -> Page:
+    return Page(f"🔧 Раздел {module_id}.{submodule_id}.{page} в разработке", placeholder=True)
+
+
+# --- компиляция ---
+
+class _Compiler:
+    def __init__(self, images_dir: Path) -> None:
+        self.images_dir = images_dir
+        self.errors: List[str] = []
+        self.warnings: List[str] = []
+
+    def _text(self, where: str, value, field: str) -> str:
+        if not isinstance(value, str) or not value.strip():
+            self.errors.append(f"{where}: нет '{field}'")
+            return ""
+        return value
+
+    def _numbering(self, where: str, keys, what: str) -> bool:
+        """Ключи - номера 1..N подряд (они же позиции в кортежах индекса)"""
+        keys = sorted(keys)
+        if keys != list(range(1, len(keys) + 1)):
+            self.errors.append(f"{where}: {what} должны нумероваться 1..N подряд, а не {keys}")
+            return False
+        if len(keys) > MAX_NUMBER:
+            self.errors.append(f"{where}: больше {MAX_NUMBER} ({what})")
+            return False
+        return True
+
+    def modules(self, modules: dict, texts: dict) -> Tuple[Module, ...]:
+        if not self._numbering("MODULES", modules, "модули"):
+            return ()
+        self._orphan_texts(modules, texts)
+        result = []
+        for module_id in sorted(modules):
+            source = modules[module_id]
+            where = f"модуль {module_id}"
+            if source.get('id') != module_id:
+                self.errors.append(f"{where}: 'id' {source.get('id')!r} не совпадает с ключом")
+            submodules = source.get('submodules') or {}
+            compiled = ()
+            if not submodules:
+                self.errors.append(f"{where}: нет разделов")
+            elif self._numbering(where, submodules, "разделы"):
+                compiled = tuple(
+                    self._submodule(module_id, sub_id, submodules[sub_id], texts)
+                    for sub_id in sorted(submodules)
+                )
+            result.append(Module(
+                id=module_id,
+                title=self._text(where, source.get('title'), 'title'),
+                description=source.get('description', ''),
+                submodules=compiled
+            ))
+        return tuple(result)
+
+    def _submodule(self, module_id: int, sub_id: int, source: dict, texts: dict) -> Submodule:
+        where = f"раздел {module_id}.{sub_id}"
+        if source.get('id') != sub_id:
+            self.errors.append(f"{where}: 'id' {source.get('id')!r} не совпадает с ключом")
+        total = source.get('pages')
+        if not isinstance(total, int) or not 1 <= total <= MAX_NUMBER:
+            self.errors.append(f"{where}: 'pages' должно быть от 1 до {MAX_NUMBER}, а не {total!r}")
+            total = 0
+        pages = []
+        for page in range(1, total + 1):
+            key = (module_id, sub_id, page)
+            if key in texts:
+                pages.append(self._page(key, texts[key]))
+            else:
+                self.warnings.append(f"страница {module_id}.{sub_id}.{page}: нет текста, будет заглушка")
+                pages.append(placeholder_page(*key))
+        return Submodule(
+            id=sub_id,
+            title=self._text(where, source.get('title'), 'title'),
+            description=source.get('description', ''),
+            pages=tuple(pages)
+        )
+
+    def _page(self, key: Tuple[int, int, int], source: dict) -> Page:
+        where = "страница {}.{}.{}".format(*key)
+        image = source.get('image')
+        if image is not None:
+            if not isinstance(image, str) or not image:
+                self.errors.append(f"{where}: 'image' должно быть путем или None")
+                image = None
+            elif not (self.images_dir / image).is_file():
+                # Страница без картинки уходит текстом (см. handlers/theory.py)
+                self.warnings.append(f"{where}: нет файла images/{image}")
+        return Page(self._text(where, source.get('text'), 'text'), image)
+
+    def _orphan_texts(self, modules: dict, texts: dict) -> None:
+        """Тексты, до которых нельзя дойти кнопками"""
+        for key in texts:
+            if not (isinstance(key, tuple) and len(key) == 3):
+                self.errors.append(f"TEXTS: ключ {key!r} должен быть (модуль, раздел, страница)")
+                continue
+            module_id, sub_id, page = key
+            submodule = modules.get(module_id, {}).get('submodules', {}).get(sub_id)
+            if submodule is None:
+                self.errors.append(f"страница {module_id}.{sub_id}.{page}: нет такого раздела")
+            elif not isinstance(page, int) or not 1 <= page <= submodule.get('pages', 0):
+                self.errors.append(
+                    f"страница {module_id}.{sub_id}.{page}: вне раздела "
+                    f"(в modules.py 'pages': {submodule.get('pages')})"
+                )
+
+    def _by_module(self, name: str, source: dict, total_modules: int) -> None:
+        for module_id in source:
+            if not isinstance(module_id, int) or not 1 <= module_id <= total_modules:
+                self.errors.append(f"{name}: нет модуля {module_id!r}")
+
+    def questions(self, questions: dict, total_modules: int) -> Tuple[Tuple[Question, ...], ...]:
+        self._by_module("QUESTIONS", questions, total_modules)
+        result = []
+        for module_id in range(1, total_modules + 1):
+            source = questions.get(module_id) or []
+            if len(source) > MAX_NUMBER:
+                self.errors.append(f"тест модуля {module_id}: больше {MAX_NUMBER} вопросов")
+            result.append(tuple(
+                self._question(f"вопрос {module_id}.{i}", question)
+                for i, question in enumerate(source, 1)
+            ))
+        return tuple(result)
+
+    def _question(self, where: str, source: dict) -> Question:
+        options = source.get('options') or []
+        if not 2 <= len(options) <= MAX_NUMBER:
+            self.errors.append(f"{where}: нужно от 2 до {MAX_NUMBER} вариантов ответа")
+        correct = source.get('correct')
+        if not isinstance(correct, int) or not 0 <= correct < len(options):
+            self.errors.append(f"{where}: 'correct' {correct!r} вне вариантов ответа")
+        return Question(
+            text=self._text(where, source.get('text'), 'text'),
+            options=tuple(self._text(where, option, 'options') for option in options),
+            correct=correct if isinstance(correct, int) else 0,
+            explanation=source.get('explanation', '')
+        )
+
+    def tasks(self, tasks: dict, total_modules: int) -> Tuple[Tuple[Task, ...], ...]:
+        self._by_module("PRACTICE_TASKS", tasks, total_modules)
+        result = []
+        for module_id in range(1, total_modules + 1):
+            source = tasks.get(module_id) or []
+            if len(source) > MAX_NUMBER:
+                self.errors.append(f"задания модуля {module_id}: больше {MAX_NUMBER}")
+            result.append(tuple(
+                self._task(f"задание {module_id}.{i}", task) for i, task in enumerate(source, 1)
+            ))
+        return tuple(result)
+
+    def _task(self, where: str, source: dict) -> Task:
+        return Task(
+            title=self._text(where, source.get('title'), 'title'),
+            description=self._text(where, source.get('description'), 'description'),
+            check=self._text(where, source.get('check'), 'check'),
+            resources=tuple(source.get('resources') or ())
+        )
+
+
+def imported_sources() -> Dict[str, dict]:
+    """Исходники из модулей content.* (импортируются при первом вызове)"""
+    return {
+        name: getattr(importlib.import_module(f"content.{Path(filename).stem}"), variable)
+        for name, (filename, variable) in SOURCES.items()
+    }
+
+
+def build_index(
+    sources: Optional[Dict[str, dict]] = None,
+    images_dir: Path = IMAGES_DIR
+) -> ContentIndex:
+    """Проверяет исходники (по умолчанию imported_sources()) и собирает
+    индекс; ContentError, если есть ошибки"""
+    if sources is None:
+        sources = imported_sources()
+    compiler = _Compiler(images_dir)
+    compiled = compiler.modules(sources['modules'], sources['texts'])
+    index = ContentIndex(
+        modules=compiled,
+        questions=compiler.questions(sources['questions'], len(compiled)),
+        tasks=compiler.tasks(sources['tasks'], len(compiled)),
+        warnings=tuple(compiler.warnings)
+    )
+    if compiler.errors:
+        raise ContentError(compiler.errors)
+    return index
+
+
+def read_sources(content_dir: Path = CONTENT_DIR) -> Dict[str, dict]:
+    """Заново читает исходники с диска, не трогая уже импортированные модули
+    content.* (для перезагрузки содержимого)"""
+    sources = {}
+    for name, (filename, variable) in SOURCES.items():
+        path = content_dir / filename
+        spec = importlib.util.spec_from_file_location(f"_content_{path.stem}", path)
+        module = importlib.util.module_from_spec(spec)
+        try:
+            spec.loader.exec_module(module)
+            sources[name] = getattr(module, variable)
+        except Exception as e:
+            raise ContentError([f"{filename}: {type(e).__name__}: {e}"]) from e
+    return sources
+
+
+# --- текущий индекс ---
+
+_index: Optional[ContentIndex] = None
+_derived_builders: Dict[str, Callable[[ContentIndex], Any]] = {}
+
+
+def register_derived(name: str, build: Callable[[ContentIndex], Any]) -> None:
+    """Регистрирует кэш, который строится из индекса и заменяется вместе с ним"""
+    _derived_builders[name] = build
+
+
+def prepare(index: ContentIndex) -> ContentIndex:
+    """Строит производные кэши индекса; можно вызывать вне цикла событий"""
+    for name, build in _derived_builders.items():
+        index.derived[name] = build(index)
+    return index
+
+
+def publish(index: ContentIndex) -> None:
+    """Делает готовый индекс текущим"""
+    global _index
+    _index = index
+
+
+def derived(name: str) -> Any:
+    """Производный кэш текущего индекса (строится при первом обращении,
+    если его зарегистрировали после публикации)"""
+    index = get_index()
+    value = index.derived.get(name)
+    if value is None:
+        value = index.derived[name] = _derived_builders[name](index)
+    return value
+
+
+def log_warnings(index: ContentIndex) -> None:
+    for warning in index.warnings:
+        logger.debug(f"Содержимое: {warning}")
+    if index.warnings:
+        logger.warning(
+            f"Содержимое: предупреждений {len(index.warnings)}, список: python -m content.index"
+        )
+
+
+def load_index() -> ContentIndex:
+    """Собирает индекс и его производные кэши (клавиатуры и т.д.) и публикует
+    его (при старте бота). Кэши, зарегистрированные позже, построятся при
+    первом обращении."""
+    index = build_index()
+    log_warnings(index)
+    publish(prepare(index))
+    logger.info(
+        f"Содержимое: модулей {len(index.modules)}, страниц "
+        f"{sum(len(sub.pages) for module in index.modules for sub in module.submodules)}"
+    )
+    return index
+
+
+def get_index() -> ContentIndex:
+    return _index if _index is not None else load_index()
+
+
+def get_module(module_id: int) -> Optional[Module]:
+    """Модуль по номеру или None"""
+    return get_index().module(module_id)
+
+
+def get_submodule(module_id: int, submodule_id: int) -> Optional[Submodule]:
+    """Раздел по номерам модуля и раздела или None"""
+    return get_index().submodule(module_id, submodule_id)
+
+
+def get_content(module_id: int, submodule_id: int, page: int) -> Optional[Page]:
+    """Страница раздела (для недописанных - заглушка) или None вне раздела"""
+    return get_index().page(module_id, submodule_id, page)
+
+
+def get_total_modules() -> int:
+    return len(get_index().modules)
+
+
+def get_questions(module_id: int) -> Tuple[Question, ...]:
+    """Вопросы теста модуля (пустой кортеж, если теста нет)"""
+    return get_index().module_questions(module_id)
+
+
+def get_tasks(module_id: int) -> Tuple[Task, ...]:
+    """Практические задания модуля (пустой кортеж, если их нет)"""
+    return get_index().module_tasks(module_id)
+
+
+def main() -> None:
+    try:
+        index = build_index()
+    except ContentError as e:
+        sys.exit(str(e))
+    for warning in index.warnings:
+        print(f"! {warning}")
+    pages = [page for module in index.modules for sub in module.submodules for page in sub.pages]
+    print(
+        f"Модулей: {len(index.modules)}, страниц: {len(pages)} "
+        f"(заглушек: {sum(page.placeholder for page in pages)}), "
+        f"вопросов: {sum(map(len, index.questions))}, заданий: {sum(map(len, index.tasks))}"
+    )
+
+
+if __name__ == "__main__":
+    main()
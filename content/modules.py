@@ -56,7 +56,7 @@ MODULES = {
             3: {
                 'id': 3,
                 'title': '2.3. DNS и DHCP',
-                'pages': 2,
+                'pages': 3,
                 'description': 'Протоколы разрешения имен'
             },
             4: {
@@ -81,7 +81,7 @@ MODULES = {
             2: {
                 'id': 2,
                 'title': '3.2. Анализ вредоносного трафика',
-                'pages': 2,
+                'pages': 3,
                 'description': 'Выявление подозрительной активности'
             },
             3: {
@@ -149,21 +149,3 @@ MODULES = {
         }
     }
 }
-
-def get_module(module_id: int) -> dict:
-    """Получает данные модуля по ID"""
-    return MODULES.get(module_id, {})
-
-def get_submodule(module_id: int, submodule_id: int) -> dict:
-    """Получает данные подмодуля по ID модуля и подмодуля"""
-    module = get_module(module_id)
-    return module.get('submodules', {}).get(submodule_id, {})
-
-def get_total_modules() -> int:
-    """Возвращает общее количество доступных модулей"""
-    return len(MODULES)
-
-def get_total_submodules(module_id: int) -> int:
-    """Возвращает количество подмодулей в указанном модуле"""
-    module = get_module(module_id)
-    return len(module.get('submodules', {}))
\ No newline at end of file
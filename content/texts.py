@@ -338,13 +338,3 @@ TEXTS = {
         'image': "module5/5_1_1.png"
     }
 }
-
-def get_content(module: int, submodule: int, page: int) -> dict:
-    """Безопасное получение контента с fallback"""
-    return TEXTS.get(
-        (module, submodule, page),
-        {
-            'text': f"🔧 Раздел {module}.{submodule}.{page} в разработке",
-            'image': None
-        }
-    )
\ No newline at end of file
@@ -0,0 +1,110 @@
+import asyncio
+import gzip
+import logging
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from data import database
+
+logger = logging.getLogger(__name__)
+
+
+class BackupJob:
+    """Фоновое резервное копирование порциями с ротацией снимков"""
+
+    def __init__(
+        self,
+        backup_dir: Union[str, Path],
+        keep: int = 7,
+        pages: int = 256,
+        step_sleep: float = 0.05,
+        compress: bool = False
+    ) -> None:
+        self.backup_dir = Path(backup_dir)
+        self.keep = keep
+        self.pages = pages
+        self.step_sleep = step_sleep
+        self.compress = compress
+        self.progress: Dict[int, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stop = asyncio.Event()
+
+    @property
+    def _prefix(self) -> str:
+        return f"{Path(database.DATABASE_PATH).stem}-"
+
+    def _on_step(self, shard: int, remaining: int, total: int) -> None:
+        done = 1.0 - remaining / total if total else 1.0
+        self.progress[shard] = done
+        logger.debug(f"Резервная копия шарда {shard}: {done:.0%}")
+
+    async def run(self) -> List[Path]:
+        """Делает снимок, при необходимости сжимает его и удаляет старые снимки"""
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        target = self.backup_dir / f"{self._prefix}{stamp}{Path(database.DATABASE_PATH).suffix}"
+        self.progress = {}
+
+        started = time.monotonic()
+        await database.backup_database(
+            str(target),
+            pages=self.pages,
+            sleep=self.step_sleep,
+            progress=self._on_step
+        )
+        files = sorted(self.backup_dir.glob(f"{target.name}*"))
+        if self.compress:
+            # Сжатие - чисто файловая работа, выносим ее из цикла событий
+            files = [await asyncio.to_thread(self._compress, path) for path in files]
+        logger.info(
+            f"Резервная копия {target.name} готова за {time.monotonic() - started:.1f} с "
+            f"({len(files)} файл(ов))"
+        )
+        self._rotate()
+        return files
+
+    @staticmethod
+    def _compress(path: Path) -> Path:
+        compressed = path.with_name(path.name + ".gz")
+        with open(path, "rb") as src, gzip.open(compressed, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        path.unlink()
+        return compressed
+
+    def _rotate(self) -> None:
+        """Оставляет self.keep последних снимков (все файлы шардов одного снимка вместе)"""
+        snapshots: Dict[str, List[Path]] = {}
+        for path in self.backup_dir.glob(f"{self._prefix}*"):
+            stamp = path.name[len(self._prefix):].split(".", 1)[0]
+            snapshots.setdefault(stamp, []).append(path)
+        for stamp in sorted(snapshots)[:-self.keep]:
+            for path in snapshots[stamp]:
+                path.unlink()
+            logger.info(f"Удален старый снимок {self._prefix}{stamp}")
+
+    async def _run_periodically(self, interval: float) -> None:
+        while not self._stop.is_set():
+            try:
+                await self.run()
+            except Exception as e:
+                logger.error(f"Ошибка резервного копирования: {e}")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, interval: float) -> None:
+        """Запускает периодическое копирование в фоне, не блокируя обработку апдейтов"""
+        if self._task is None:
+            self._stop.clear()
+            self._task = asyncio.create_task(self._run_periodically(interval))
+
+    async def stop(self) -> None:
+        """Останавливает расписание, дождавшись окончания текущего снимка"""
+        task, self._task = self._task, None
+        if task is not None:
+            self._stop.set()
+            await task
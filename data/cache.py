@@ -0,0 +1,113 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class ProgressCache:
+    """LRU-кэш прогресса пользователей с ограничением размера и временем жизни записей.
+
+    Чтение из базы обрамляется begin_load()/finish_load(): если за время чтения
+    прогресс пользователя изменился (update, mark_completed, invalidate), прочитанная
+    строка могла устареть и в кэш не кладется. Номера поколений хранятся только
+    для пользователей, чье чтение еще идет.
+
+    Изменения из других процессов кэш не видит: бот работает одним процессом."""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[int, Tuple[float, dict]]" = OrderedDict()
+        self._generation = 0
+        # user_id -> число идущих чтений; user_id -> поколение последней записи во время чтения
+        self._loading: Dict[int, int] = {}
+        self._written: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _copy(progress: dict) -> dict:
+        copy = dict(progress)
+        copy['completed_modules'] = list(progress['completed_modules'])
+        return copy
+
+    def get(self, user_id: int) -> Optional[dict]:
+        """Возвращает копию прогресса из кэша или None"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, progress = entry
+        if expires < time.monotonic():
+            del self._entries[user_id]
+            self.evictions += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return self._copy(progress)
+
+    def _changed(self, user_id: int) -> None:
+        self._generation += 1
+        if user_id in self._loading:
+            self._written[user_id] = self._generation
+
+    def begin_load(self, user_id: int) -> int:
+        """Отмечает начало чтения из базы; возвращает поколение для finish_load"""
+        self._loading[user_id] = self._loading.get(user_id, 0) + 1
+        return self._generation
+
+    def finish_load(self, user_id: int, generation: int, progress: Optional[dict]) -> None:
+        """Кладет прочитанный прогресс в кэш, если за время чтения его не меняли.
+        progress=None - чтение не удалось, только снимает отметку."""
+        stale = self._written.get(user_id, 0) > generation
+        remaining = self._loading[user_id] - 1
+        if remaining:
+            self._loading[user_id] = remaining
+        else:
+            del self._loading[user_id]
+            self._written.pop(user_id, None)
+        if progress is not None and not stale:
+            self.put(user_id, progress)
+
+    def put(self, user_id: int, progress: dict) -> None:
+        """Кладет прогресс в кэш, вытесняя самые давние записи"""
+        self._entries[user_id] = (time.monotonic() + self.ttl, self._copy(progress))
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def update(self, user_id: int, **fields) -> None:
+        """Применяет запись к закэшированному прогрессу, если он есть"""
+        self._changed(user_id)
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        progress = entry[1]
+        for key, value in fields.items():
+            if value is not None:
+                progress[key] = value
+
+    def mark_completed(self, user_id: int, module: int) -> None:
+        """Добавляет модуль в список завершенных у закэшированного пользователя"""
+        self._changed(user_id)
+        entry = self._entries.get(user_id)
+        if entry is not None and module not in entry[1]['completed_modules']:
+            entry[1]['completed_modules'].append(module)
+
+    def invalidate(self, user_id: int) -> None:
+        self._changed(user_id)
+        self._entries.pop(user_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики попаданий и промахов"""
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
@@ -1,13 +1,208 @@
 import aiosqlite
+import asyncio
+import heapq
 import json
+import logging
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Tuple, List, Optional
+from typing import AsyncIterator, Callable, Dict, Tuple, List, Optional
+from config import DB_POOL_SIZE, DB_SHARDS
+from data.cache import ProgressCache
+from data.pool import ConnectionPool
+from data.write_behind import AppendBuffer, PendingProgress, ProgressWriteBuffer
+
+logger = logging.getLogger(__name__)
 
 DATABASE_PATH = Path(__file__).parent / "user_progress.db"
 
+# Число шардов; при одном шарде используется DATABASE_PATH как есть
+SHARD_COUNT = DB_SHARDS
+
+_pools: List[ConnectionPool] = []
+
+def shard_paths() -> List[Path]:
+    """Пути к файлам всех шардов"""
+    path = Path(DATABASE_PATH)
+    if SHARD_COUNT == 1:
+        return [path]
+    return [path.with_name(f"{path.stem}.{i}{path.suffix}") for i in range(SHARD_COUNT)]
+
+def shard_for(user_id: int) -> int:
+    """Номер шарда, в котором хранится пользователь"""
+    return user_id % SHARD_COUNT
+
+async def open_pool(size: int = DB_POOL_SIZE, busy_timeout: float = 5.0) -> None:
+    """Открывает по пулу соединений на каждый шард"""
+    global _pools
+    if _pools:
+        return
+    pools = [
+        ConnectionPool(path, size=size, busy_timeout=busy_timeout)
+        for path in shard_paths()
+    ]
+    for pool in pools:
+        await pool.open()
+    _pools = pools
+
+async def close_pool() -> None:
+    """Закрывает пулы соединений всех шардов"""
+    global _pools
+    pools, _pools = _pools, []
+    for pool in pools:
+        await pool.close()
+
+async def _write_pending(entries: List[Tuple[int, PendingProgress]]) -> None:
+    """Записывает накопленные позиции: по одной транзакции на шард, шарды параллельно"""
+    by_shard: Dict[int, list] = {}
+    for user_id, e in entries:
+        by_shard.setdefault(shard_for(user_id), []).append(
+            _upsert_params(user_id, e.module, e.submodule, e.page, 0, e.last_active)
+        )
+
+    async def write(shard: int, params: list) -> None:
+        async with _connect(shard) as db:
+            await db.executemany(_UPSERT_PROGRESS, params)
+            await db.commit()
+
+    await asyncio.gather(*(write(shard, params) for shard, params in by_shard.items()))
+
+_write_buffer = ProgressWriteBuffer(_write_pending)
+
+_INSERT_TEST_ANSWER = """
+    INSERT INTO test_answers (
+        user_id, module_id, question_index, option_index, is_correct,
+        latency_ms, answered_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+_INSERT_TEST_ATTEMPT = """
+    INSERT INTO test_attempts (
+        user_id, module_id, score, total, passed, finished_at
+    ) VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+async def _write_test_log(rows: List[tuple]) -> None:
+    """Записывает пачку журнала тестов: по одной транзакции на шард.
+    Строка журнала - (запрос, параметры); первый параметр всегда user_id."""
+    by_shard: Dict[int, Dict[str, list]] = {}
+    for query, params in rows:
+        by_shard.setdefault(shard_for(params[0]), {}).setdefault(query, []).append(params)
+
+    async def write(shard: int, batches: Dict[str, list]) -> None:
+        async with _connect(shard) as db:
+            for query, params in batches.items():
+                await db.executemany(query, params)
+            await db.commit()
+
+    await asyncio.gather(*(write(shard, batches) for shard, batches in by_shard.items()))
+
+_test_log = AppendBuffer(_write_test_log)
+
+async def start_write_buffer(interval: float = 0.3, max_entries: int = 500) -> None:
+    """Включает отложенную запись позиций пользователей и журнала тестов"""
+    _write_buffer.interval = interval
+    _write_buffer.max_entries = max_entries
+    _write_buffer.start()
+    _test_log.start()
+
+async def stop_write_buffer() -> None:
+    """Выключает отложенную запись, сбрасывая все накопленное на диск"""
+    await _write_buffer.stop()
+    await _test_log.stop()
+    if _test_log.dropped:
+        logger.warning(f"Журнал тестов: отброшено строк при переполнении: {_test_log.dropped}")
+
+async def _log_test_row(query: str, params: tuple) -> None:
+    if _test_log.is_running:
+        _test_log.add((query, params))
+    else:
+        await _write_test_log([(query, params)])
+
+async def log_test_answer(
+    user_id: int,
+    module_id: int,
+    question_index: int,
+    option_index: int,
+    is_correct: bool,
+    latency_ms: Optional[int] = None
+) -> None:
+    """Записывает ответ на вопрос теста (в фоне, пачкой с другими)"""
+    await _log_test_row(_INSERT_TEST_ANSWER, (
+        user_id, module_id, question_index, option_index,
+        int(is_correct), latency_ms, _now()
+    ))
+
+async def log_test_attempt(
+    user_id: int,
+    module_id: int,
+    score: int,
+    total: int,
+    passed: bool
+) -> None:
+    """Записывает итог завершенной попытки теста (в фоне, пачкой с другими)"""
+    await _log_test_row(_INSERT_TEST_ATTEMPT, (
+        user_id, module_id, score, total, int(passed), _now()
+    ))
+
+# Кэш и буфер отложенной записи прогресса принадлежат процессу: базой
+# пользуется один процесс бота (см. services/webhook.py), иначе другой
+# процесс видел бы устаревший прогресс до истечения ttl кэша
+_progress_cache = ProgressCache()
+
+def configure_progress_cache(maxsize: int = 10000, ttl: float = 300.0) -> None:
+    """Настраивает размер и время жизни кэша прогресса"""
+    _progress_cache.maxsize = maxsize
+    _progress_cache.ttl = ttl
+
+def get_cache_stats() -> dict:
+    """Счетчики кэша прогресса: размер, попадания, промахи, вытеснения"""
+    return _progress_cache.stats()
+
+def _now() -> int:
+    """Текущее время в секундах Unix (формат колонки last_active)"""
+    return int(time.time())
+
+@asynccontextmanager
+async def _connect(shard: int = 0) -> AsyncIterator[aiosqlite.Connection]:
+    """Соединение с шардом из пула, либо разовое соединение, если пул не открыт"""
+    if _pools:
+        async with _pools[shard].acquire() as db:
+            yield db
+    else:
+        async with aiosqlite.connect(shard_paths()[shard]) as db:
+            db.row_factory = aiosqlite.Row
+            yield db
+
+async def _unsharded_users() -> int:
+    """Пользователей в файле DATABASE_PATH (без шардов); 0, если файла или таблицы нет"""
+    path = Path(DATABASE_PATH)
+    if not path.exists():
+        return 0
+    async with aiosqlite.connect(f"{path.as_uri()}?mode=ro", uri=True) as db:
+        cursor = await db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_progress'"
+        )
+        if await cursor.fetchone() is None:
+            return 0
+        cursor = await db.execute("SELECT COUNT(*) FROM user_progress")
+        return (await cursor.fetchone())[0]
+
 async def init_db() -> None:
-    """Инициализация базы данных"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    """Инициализация базы данных (всех шардов)"""
+    if SHARD_COUNT > 1:
+        # Шарды создаются пустыми: пользователи из общего файла пропали бы молча
+        users = await _unsharded_users()
+        if users:
+            raise RuntimeError(
+                f"DB_SHARDS={SHARD_COUNT}, но в {DATABASE_PATH} {users} пользователей: "
+                "шарды создаются пустыми. Перенесите данные или верните DB_SHARDS=1"
+            )
+    for shard in range(SHARD_COUNT):
+        await _init_shard(shard)
+
+async def _init_shard(shard: int) -> None:
+    async with _connect(shard) as db:
         await db.execute("""
             CREATE TABLE IF NOT EXISTS user_progress (
                 user_id INTEGER PRIMARY KEY,
@@ -22,33 +217,469 @@ async def init_db() -> None:
             CREATE INDEX IF NOT EXISTS idx_last_active 
             ON user_progress (last_active)
         """)
+        await _migrate(db)
         await db.commit()
 
-async def get_user_progress(user_id: int) -> Tuple[int, int, int, List[int]]:
-    """Получение текущего прогресса пользователя"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
+def modules_to_mask(modules: List[int]) -> int:
+    """Список завершенных модулей -> битовая маска (модуль N -> бит N-1)"""
+    mask = 0
+    for module in modules:
+        mask |= 1 << (module - 1)
+    return mask
+
+def mask_to_modules(mask: int) -> List[int]:
+    """Битовая маска -> отсортированный список завершенных модулей"""
+    modules = []
+    module = 1
+    while mask:
+        if mask & 1:
+            modules.append(module)
+        mask >>= 1
+        module += 1
+    return modules
+
+async def _migration_completed_mask(db: aiosqlite.Connection) -> None:
+    """Перенос completed_modules (JSON) в целочисленную маску completed_mask.
+    Старая колонка остается в схеме, но больше не обновляется."""
+    # sqlite3 не открывает транзакцию перед DDL сам: без явного BEGIN колонка
+    # добавилась бы сразу, и сбой до записи user_version сломал бы повторный запуск
+    await db.execute("BEGIN")
+    await db.execute(
+        "ALTER TABLE user_progress ADD COLUMN completed_mask INTEGER NOT NULL DEFAULT 0"
+    )
+    cursor = await db.execute(
+        "SELECT user_id, completed_modules FROM user_progress "
+        "WHERE completed_modules IS NOT NULL AND completed_modules NOT IN ('', '[]')"
+    )
+    rows = await cursor.fetchall()
+    await db.executemany(
+        "UPDATE user_progress SET completed_mask = ? WHERE user_id = ?",
+        [(modules_to_mask(json.loads(row[1])), row[0]) for row in rows]
+    )
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_completed_mask
+        ON user_progress (completed_mask)
+    """)
+
+# Сколько модулей учитывается в stats_completion (биты маски 1..N)
+STATS_MODULES = 62
+
+async def _migration_course_stats(db: aiosqlite.Connection) -> None:
+    """Агрегаты курса, которые поддерживают триггеры на user_progress в той же
+    транзакции, что и сама запись: сколько пользователей стоит на каждой
+    странице, сколько завершило каждый модуль и сколько было активно по дням"""
+    # executescript работает вне транзакции модуля sqlite3, поэтому
+    # открываем ее явно: миграция и номер версии фиксируются вместе
+    await db.executescript(f"""
+        BEGIN;
+
+        CREATE TABLE IF NOT EXISTS stats_position (
+            module INTEGER NOT NULL,
+            submodule INTEGER NOT NULL,
+            page INTEGER NOT NULL,
+            users INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (module, submodule, page)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS stats_completion (
+            module INTEGER PRIMARY KEY,
+            users INTEGER NOT NULL DEFAULT 0
+        );
+
+        CREATE TABLE IF NOT EXISTS stats_daily_active (
+            day TEXT PRIMARY KEY,
+            users INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+
+        WITH RECURSIVE modules(module) AS (
+            SELECT 1 UNION ALL SELECT module + 1 FROM modules WHERE module < {STATS_MODULES}
+        )
+        INSERT OR IGNORE INTO stats_completion (module) SELECT module FROM modules;
+
+        -- Заполнение по уже существующим строкам. Дневная активность
+        -- восстанавливается только за последний день каждого пользователя.
+        -- Старая схема допускала NULL в позиции: считаем ее первой страницей,
+        -- как get_user_progress (и как пересборка в следующей миграции)
+        INSERT INTO stats_position (module, submodule, page, users)
+        SELECT COALESCE(current_module, 1), COALESCE(current_submodule, 1),
+               COALESCE(current_page, 1), COUNT(*)
+        FROM user_progress GROUP BY 1, 2, 3;
+
+        UPDATE stats_completion SET users = (
+            SELECT COUNT(*) FROM user_progress
+            WHERE (completed_mask >> (stats_completion.module - 1)) & 1
+        );
+
+        INSERT INTO stats_daily_active (day, users)
+        SELECT date(last_active), COUNT(*) FROM user_progress
+        WHERE last_active IS NOT NULL GROUP BY 1;
+
+        CREATE TRIGGER IF NOT EXISTS trg_stats_insert AFTER INSERT ON user_progress
+        BEGIN
+            INSERT INTO stats_position (module, submodule, page, users)
+            VALUES (COALESCE(NEW.current_module, 1), COALESCE(NEW.current_submodule, 1),
+                    COALESCE(NEW.current_page, 1), 1)
+            ON CONFLICT (module, submodule, page) DO UPDATE SET users = users + 1;
+
+            UPDATE stats_completion SET users = users + 1
+            WHERE NEW.completed_mask != 0
+              AND (NEW.completed_mask >> (module - 1)) & 1;
+
+            INSERT INTO stats_daily_active (day, users)
+            SELECT date(NEW.last_active), 1 WHERE NEW.last_active IS NOT NULL
+            ON CONFLICT (day) DO UPDATE SET users = users + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_stats_position
+        AFTER UPDATE OF current_module, current_submodule, current_page ON user_progress
+        WHEN OLD.current_module IS NOT NEW.current_module
+          OR OLD.current_submodule IS NOT NEW.current_submodule
+          OR OLD.current_page IS NOT NEW.current_page
+        BEGIN
+            UPDATE stats_position SET users = users - 1
+            WHERE module = COALESCE(OLD.current_module, 1)
+              AND submodule = COALESCE(OLD.current_submodule, 1)
+              AND page = COALESCE(OLD.current_page, 1);
+
+            INSERT INTO stats_position (module, submodule, page, users)
+            VALUES (COALESCE(NEW.current_module, 1), COALESCE(NEW.current_submodule, 1),
+                    COALESCE(NEW.current_page, 1), 1)
+            ON CONFLICT (module, submodule, page) DO UPDATE SET users = users + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_stats_completion
+        AFTER UPDATE OF completed_mask ON user_progress
+        WHEN OLD.completed_mask != NEW.completed_mask
+        BEGIN
+            UPDATE stats_completion
+            SET users = users
+                + ((NEW.completed_mask >> (module - 1)) & 1)
+                - ((OLD.completed_mask >> (module - 1)) & 1)
+            WHERE (((NEW.completed_mask | OLD.completed_mask)
+                    - (NEW.completed_mask & OLD.completed_mask)) >> (module - 1)) & 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_stats_daily_active
+        AFTER UPDATE OF last_active ON user_progress
+        WHEN date(NEW.last_active) IS NOT date(OLD.last_active)
+        BEGIN
+            INSERT INTO stats_daily_active (day, users)
+            VALUES (date(NEW.last_active), 1)
+            ON CONFLICT (day) DO UPDATE SET users = users + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_stats_delete AFTER DELETE ON user_progress
+        BEGIN
+            UPDATE stats_position SET users = users - 1
+            WHERE module = COALESCE(OLD.current_module, 1)
+              AND submodule = COALESCE(OLD.current_submodule, 1)
+              AND page = COALESCE(OLD.current_page, 1);
+
+            UPDATE stats_completion SET users = users - 1
+            WHERE OLD.completed_mask != 0
+              AND (OLD.completed_mask >> (module - 1)) & 1;
+        END;
+    """)
+
+async def _migration_epoch_last_active(db: aiosqlite.Connection) -> None:
+    """Пересборка user_progress: last_active хранится целым числом секунд Unix,
+    поля позиции становятся NOT NULL, устаревшая колонка completed_modules удаляется.
+    Триггеры агрегатов пересоздаются под новый формат времени."""
+    await db.executescript("""
+        BEGIN;
+
+        CREATE TABLE user_progress_new (
+            user_id INTEGER PRIMARY KEY,
+            current_module INTEGER NOT NULL DEFAULT 1,
+            current_submodule INTEGER NOT NULL DEFAULT 1,
+            current_page INTEGER NOT NULL DEFAULT 1,
+            completed_mask INTEGER NOT NULL DEFAULT 0,
+            last_active INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+        );
+
+        INSERT INTO user_progress_new
+        SELECT user_id,
+               COALESCE(current_module, 1),
+               COALESCE(current_submodule, 1),
+               COALESCE(current_page, 1),
+               completed_mask,
+               COALESCE(
+                   CAST(strftime('%s', last_active) AS INTEGER),
+                   CAST(strftime('%s', 'now') AS INTEGER)
+               )
+        FROM user_progress;
+
+        -- Вместе с таблицей удаляются ее индексы и триггеры
+        DROP TABLE user_progress;
+        ALTER TABLE user_progress_new RENAME TO user_progress;
+
+        CREATE INDEX idx_last_active ON user_progress (last_active);
+        CREATE INDEX idx_completed_mask ON user_progress (completed_mask);
+
+        CREATE TRIGGER trg_stats_insert AFTER INSERT ON user_progress
+        BEGIN
+            INSERT INTO stats_position (module, submodule, page, users)
+            VALUES (NEW.current_module, NEW.current_submodule, NEW.current_page, 1)
+            ON CONFLICT (module, submodule, page) DO UPDATE SET users = users + 1;
+
+            UPDATE stats_completion SET users = users + 1
+            WHERE NEW.completed_mask != 0
+              AND (NEW.completed_mask >> (module - 1)) & 1;
+
+            INSERT INTO stats_daily_active (day, users)
+            VALUES (date(NEW.last_active, 'unixepoch'), 1)
+            ON CONFLICT (day) DO UPDATE SET users = users + 1;
+        END;
+
+        CREATE TRIGGER trg_stats_position
+        AFTER UPDATE OF current_module, current_submodule, current_page ON user_progress
+        WHEN OLD.current_module != NEW.current_module
+          OR OLD.current_submodule != NEW.current_submodule
+          OR OLD.current_page != NEW.current_page
+        BEGIN
+            UPDATE stats_position SET users = users - 1
+            WHERE module = OLD.current_module
+              AND submodule = OLD.current_submodule
+              AND page = OLD.current_page;
+
+            INSERT INTO stats_position (module, submodule, page, users)
+            VALUES (NEW.current_module, NEW.current_submodule, NEW.current_page, 1)
+            ON CONFLICT (module, submodule, page) DO UPDATE SET users = users + 1;
+        END;
+
+        CREATE TRIGGER trg_stats_completion
+        AFTER UPDATE OF completed_mask ON user_progress
+        WHEN OLD.completed_mask != NEW.completed_mask
+        BEGIN
+            UPDATE stats_completion
+            SET users = users
+                + ((NEW.completed_mask >> (module - 1)) & 1)
+                - ((OLD.completed_mask >> (module - 1)) & 1)
+            WHERE (((NEW.completed_mask | OLD.completed_mask)
+                    - (NEW.completed_mask & OLD.completed_mask)) >> (module - 1)) & 1;
+        END;
+
+        CREATE TRIGGER trg_stats_daily_active
+        AFTER UPDATE OF last_active ON user_progress
+        WHEN NEW.last_active / 86400 != OLD.last_active / 86400
+        BEGIN
+            INSERT INTO stats_daily_active (day, users)
+            VALUES (date(NEW.last_active, 'unixepoch'), 1)
+            ON CONFLICT (day) DO UPDATE SET users = users + 1;
+        END;
+
+        CREATE TRIGGER trg_stats_delete AFTER DELETE ON user_progress
+        BEGIN
+            UPDATE stats_position SET users = users - 1
+            WHERE module = OLD.current_module
+              AND submodule = OLD.current_submodule
+              AND page = OLD.current_page;
+
+            UPDATE stats_completion SET users = users - 1
+            WHERE OLD.completed_mask != 0
+              AND (OLD.completed_mask >> (module - 1)) & 1;
+        END;
+    """)
+
+async def _migration_test_log(db: aiosqlite.Connection) -> None:
+    """Журнал тестов только на добавление: каждый ответ и каждая завершенная попытка"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS test_answers (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            module_id INTEGER NOT NULL,
+            question_index INTEGER NOT NULL,
+            option_index INTEGER NOT NULL,
+            is_correct INTEGER NOT NULL,
+            latency_ms INTEGER,
+            answered_at INTEGER NOT NULL
+        )
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_test_answers_question
+        ON test_answers (module_id, question_index)
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS test_attempts (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            module_id INTEGER NOT NULL,
+            score INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            passed INTEGER NOT NULL,
+            finished_at INTEGER NOT NULL
+        )
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_test_attempts_user
+        ON test_attempts (user_id, module_id)
+    """)
+
+async def _migration_media_cache(db: aiosqlite.Connection) -> None:
+    """file_id загруженных в Telegram картинок курса (общая таблица, шард 0)"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS media_cache (
+            path TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            updated_at INTEGER NOT NULL
+        )
+    """)
+
+async def _migration_broadcasts(db: aiosqlite.Connection) -> None:
+    """Рассылки и состояние доставки каждому получателю (общие таблицы, шард 0)"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY,
+            text TEXT NOT NULL,
+            parse_mode TEXT,
+            days INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            cursor_user_id INTEGER NOT NULL DEFAULT 0,
+            created_at INTEGER NOT NULL,
+            finished_at INTEGER
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+            broadcast_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            error TEXT,
+            sent_at INTEGER NOT NULL,
+            PRIMARY KEY (broadcast_id, user_id)
+        ) WITHOUT ROWID
+    """)
+
+async def _migration_fsm_states(db: aiosqlite.Connection) -> None:
+    """Состояния FSM aiogram (в шарде пользователя): data - закодированный
+    словарь (data/fsm_storage.py), строки без состояния и данных удаляются"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data BLOB,
+            updated_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_fsm_states_updated
+        ON fsm_states (updated_at)
+    """)
+
+# Миграции схемы по порядку; номер последней примененной хранится в PRAGMA user_version
+_MIGRATIONS = [
+    _migration_completed_mask,
+    _migration_course_stats,
+    _migration_epoch_last_active,
+    _migration_test_log,
+    _migration_media_cache,
+    _migration_broadcasts,
+    _migration_fsm_states,
+]
+
+async def _migrate(db: aiosqlite.Connection) -> None:
+    """Применяет недостающие миграции схемы"""
+    cursor = await db.execute("PRAGMA user_version")
+    version = (await cursor.fetchone())[0]
+    for number, migration in enumerate(_MIGRATIONS[version:], start=version + 1):
+        await migration(db)
+        await db.execute(f"PRAGMA user_version = {number}")
+        await db.commit()
+
+# Единственный способ записи прогресса: вставка новой строки либо обновление
+# существующей. Пустые (NULL) поля позиции не меняют текущее значение.
+_UPSERT_PROGRESS = """
+    INSERT INTO user_progress (
+        user_id, current_module, current_submodule, current_page,
+        completed_mask, last_active
+    )
+    VALUES (
+        :user_id, COALESCE(:module, 1), COALESCE(:submodule, 1), COALESCE(:page, 1),
+        :mask, :last_active
+    )
+    ON CONFLICT(user_id) DO UPDATE SET
+        current_module = COALESCE(:module, current_module),
+        current_submodule = COALESCE(:submodule, current_submodule),
+        current_page = COALESCE(:page, current_page),
+        completed_mask = completed_mask | :mask,
+        last_active = :last_active
+"""
+
+def _upsert_params(
+    user_id: int,
+    module: Optional[int],
+    submodule: Optional[int],
+    page: Optional[int],
+    mask: int,
+    last_active: int
+) -> dict:
+    return {
+        'user_id': user_id,
+        'module': module,
+        'submodule': submodule,
+        'page': page,
+        'mask': mask,
+        'last_active': last_active
+    }
+
+def _default_progress() -> dict:
+    """Прогресс пользователя, которого еще нет в базе"""
+    return {
+        'current_module': 1,
+        'current_submodule': 1,
+        'current_page': 1,
+        'completed_modules': [],
+        'last_active': None
+    }
+
+async def get_user_progress(user_id: int) -> dict:
+    """Получает прогресс пользователя. Чтение никогда не пишет в базу."""
+    cached = _progress_cache.get(user_id)
+    if cached is not None:
+        return cached
+    # Запись, пришедшая во время чтения, не даст закэшировать устаревшую строку
+    generation = _progress_cache.begin_load(user_id)
+    progress = None
+    try:
+        progress = await _read_user_progress(user_id)
+    finally:
+        _progress_cache.finish_load(user_id, generation, progress)
+    return progress
+
+async def _read_user_progress(user_id: int) -> dict:
+    """Читает прогресс пользователя из базы с обработкой NULL значений"""
+    async with _connect(shard_for(user_id)) as db:
         cursor = await db.execute(
-            "SELECT * FROM user_progress WHERE user_id = ?",
+            "SELECT current_module, current_submodule, current_page, completed_mask, last_active "
+            "FROM user_progress WHERE user_id = ?",
             (user_id,)
         )
         row = await cursor.fetchone()
-        
-        if not row:
-            await db.execute(
-                "INSERT INTO user_progress (user_id) VALUES (?)",
-                (user_id,)
-            )
-            await db.commit()
-            return (1, 1, 1, [])
-        
-        completed = json.loads(row['completed_modules']) if row['completed_modules'] else []
-        return (
-            row['current_module'],
-            row['current_submodule'],
-            row['current_page'],
-            completed
-        )
+
+    if row is None:
+        return _apply_pending(user_id, _default_progress())
+    return _apply_pending(user_id, {
+        'current_module': row[0] if row[0] is not None else 1,
+        'current_submodule': row[1] if row[1] is not None else 1,
+        'current_page': row[2] if row[2] is not None else 1,
+        'completed_modules': mask_to_modules(row[3] or 0),
+        'last_active': row[4]
+    })
+
+def _apply_pending(user_id: int, progress: dict) -> dict:
+    """Накладывает на прочитанный прогресс еще не записанную позицию"""
+    pending = _write_buffer.peek(user_id)
+    if pending is None:
+        return progress
+    if pending.module is not None:
+        progress['current_module'] = pending.module
+    if pending.submodule is not None:
+        progress['current_submodule'] = pending.submodule
+    if pending.page is not None:
+        progress['current_page'] = pending.page
+    progress['last_active'] = pending.last_active
+    return progress
 
 async def update_user_progress(
     user_id: int,
@@ -57,106 +688,380 @@ async def update_user_progress(
     page: Optional[int] = None,
     mark_completed: bool = False
 ) -> None:
-    """Обновление прогресса пользователя с исправленной логикой завершения модулей"""
-    updates = []
-    params = []
-    
-    if module is not None:
-        updates.append("current_module = ?")
-        params.append(module)
-    if submodule is not None:
-        updates.append("current_submodule = ?")
-        params.append(submodule)
-    if page is not None:
-        updates.append("current_page = ?")
-        params.append(page)
-    
-    if mark_completed:
-        # Получаем текущий список завершенных модулей
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            cursor = await db.execute(
-                "SELECT completed_modules FROM user_progress WHERE user_id = ?",
-                (user_id,)
-            )
-            row = await cursor.fetchone()
-            completed = json.loads(row[0]) if row and row[0] else []
-            
-            # Добавляем модуль, если его еще нет в списке
-            if module not in completed:
-                completed.append(module)
-                updates.append("completed_modules = ?")
-                params.append(json.dumps(completed))
-    
-    updates.append("last_active = CURRENT_TIMESTAMP")
-    params.append(user_id)
-    
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        query = f"""
-            UPDATE user_progress 
-            SET {', '.join(updates)}
-            WHERE user_id = ?
-        """
-        await db.execute(query, params)
+    """Обновление прогресса пользователя; строка создается при первой записи"""
+    now = _now()
+    _progress_cache.update(
+        user_id,
+        current_module=module,
+        current_submodule=submodule,
+        current_page=page,
+        last_active=now
+    )
+    if not mark_completed and _write_buffer.is_running:
+        # Переходы по страницам копим в памяти и пишем пачкой
+        _write_buffer.put(user_id, PendingProgress(module, submodule, page, now))
+        return
+
+    # Завершение модуля пишем сразу, забрав из буфера незаписанную позицию
+    pending = await _write_buffer.take(user_id)
+    if pending is not None:
+        merged = pending.merge(PendingProgress(module, submodule, page))
+        module, submodule, page = merged.module, merged.submodule, merged.page
+
+    # Бит модуля выставляется атомарно, без чтения текущего значения
+    mask = modules_to_mask([module]) if mark_completed else 0
+    async with _connect(shard_for(user_id)) as db:
+        await db.execute(
+            _UPSERT_PROGRESS,
+            _upsert_params(user_id, module, submodule, page, mask, now)
+        )
         await db.commit()
 
+    # Повторно после фиксации: чтение, начатое до нее, не закэширует старую строку
+    _progress_cache.update(
+        user_id,
+        current_module=module,
+        current_submodule=submodule,
+        current_page=page,
+        last_active=now
+    )
+    if mark_completed:
+        _progress_cache.mark_completed(user_id, module)
+
 async def reset_user_progress(user_id: int) -> None:
     """Сброс прогресса пользователя"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    _write_buffer.discard(user_id)
+    async with _connect(shard_for(user_id)) as db:
         await db.execute("""
-            UPDATE user_progress 
-            SET current_module = 1,
+            INSERT INTO user_progress (user_id) VALUES (?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                current_module = 1,
                 current_submodule = 1,
                 current_page = 1,
-                completed_modules = '[]'
-            WHERE user_id = ?
+                completed_mask = 0
         """, (user_id,))
         await db.commit()
+    _progress_cache.update(
+        user_id,
+        current_module=1,
+        current_submodule=1,
+        current_page=1,
+        completed_modules=[]
+    )
+
+async def _fan_out(query) -> list:
+    """Выполняет query(shard) на всех шардах параллельно"""
+    return await asyncio.gather(*(query(shard) for shard in range(SHARD_COUNT)))
 
 async def get_active_users(days: int = 30) -> List[int]:
-    """Получение списка активных пользователей"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        cursor = await db.execute("""
-            SELECT user_id FROM user_progress
-            WHERE last_active >= date('now', ?)
-        """, (f"-{days} days",))
-        rows = await cursor.fetchall()
-        return [row[0] for row in rows]
+    """Получение списка активных пользователей (со всех шардов).
+    Для больших выборок используйте iter_active_users."""
+    return [user_id async for user_id in iter_active_users(days)]
 
-async def get_user_progress(user_id: int) -> dict:
-    """Получает полный прогресс пользователя с обработкой NULL значений"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+async def _merge_sorted(iterators: List[AsyncIterator[tuple]]) -> AsyncIterator[tuple]:
+    """Слияние отсортированных асинхронных потоков (по одному на шард)"""
+    heap = []
+    for index, iterator in enumerate(iterators):
+        first = await anext(iterator, None)
+        if first is not None:
+            heap.append((first, index))
+    heapq.heapify(heap)
+    while heap:
+        item, index = heap[0]
+        yield item
+        following = await anext(iterators[index], None)
+        if following is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (following, index))
+
+async def iter_active_users(
+    days: int = 30,
+    batch_size: int = 1000,
+    after_user_id: int = 0
+) -> AsyncIterator[int]:
+    """Активные за days дней пользователи по возрастанию user_id.
+
+    Выборка постраничная по ключу (user_id > ? LIMIT n), соединение занимается
+    только на время одной страницы, память не зависит от числа пользователей.
+    after_user_id позволяет продолжить обход с места остановки."""
+    since = _now() - days * 86400
+
+    async def shard_pages(shard: int) -> AsyncIterator[tuple]:
+        cursor_id = after_user_id
+        while True:
+            async with _connect(shard) as db:
+                rows = await db.execute_fetchall("""
+                    SELECT user_id FROM user_progress
+                    WHERE user_id > ? AND last_active >= ?
+                    ORDER BY user_id LIMIT ?
+                """, (cursor_id, since, batch_size))
+            for row in rows:
+                yield (row[0],)
+            if len(rows) < batch_size:
+                return
+            cursor_id = rows[-1][0]
+
+    async for (user_id,) in _merge_sorted([shard_pages(s) for s in range(SHARD_COUNT)]):
+        yield user_id
+
+async def iter_inactive_users(
+    min_days: int,
+    max_days: int,
+    batch_size: int = 1000
+) -> AsyncIterator[int]:
+    """Пользователи, последний раз активные от max_days до min_days дней назад
+    (например, 7..30 для рассылки-напоминания). Диапазон и постраничный ключ
+    (last_active, user_id) обслуживаются индексом idx_last_active."""
+    now = _now()
+    oldest, newest = now - max_days * 86400, now - min_days * 86400
+
+    async def shard_pages(shard: int) -> AsyncIterator[tuple]:
+        key = (oldest - 1, 0)
+        while True:
+            async with _connect(shard) as db:
+                rows = await db.execute_fetchall("""
+                    SELECT last_active, user_id FROM user_progress
+                    WHERE last_active >= ? AND last_active < ?
+                      AND (last_active, user_id) > (?, ?)
+                    ORDER BY last_active, user_id LIMIT ?
+                """, (oldest, newest, key[0], key[1], batch_size))
+            for row in rows:
+                yield (row[0], row[1])
+            if len(rows) < batch_size:
+                return
+            key = (rows[-1][0], rows[-1][1])
+
+    async for _, user_id in _merge_sorted([shard_pages(s) for s in range(SHARD_COUNT)]):
+        yield user_id
+
+async def count_module_completions(module_id: int) -> int:
+    """Количество пользователей, завершивших модуль (из агрегата stats_completion)"""
+    async def query(shard: int) -> int:
+        async with _connect(shard) as db:
+            cursor = await db.execute(
+                "SELECT users FROM stats_completion WHERE module = ?",
+                (module_id,)
+            )
+            row = await cursor.fetchone()
+            return row[0] if row else 0
+
+    return sum(await _fan_out(query))
+
+async def get_course_stats(days: int = 7) -> dict:
+    """Воронка курса по агрегатам, без прохода по user_progress:
+    positions - {(модуль, раздел, страница): пользователей},
+    completions - {модуль: завершивших},
+    daily_active - {'YYYY-MM-DD': активных} за последние days дней"""
+    async def query(shard: int) -> Tuple[list, list, list]:
+        async with _connect(shard) as db:
+            positions = await db.execute_fetchall(
+                "SELECT module, submodule, page, users FROM stats_position WHERE users > 0"
+            )
+            completions = await db.execute_fetchall(
+                "SELECT module, users FROM stats_completion WHERE users > 0"
+            )
+            daily = await db.execute_fetchall(
+                "SELECT day, users FROM stats_daily_active WHERE day >= date('now', ?)",
+                (f"-{days - 1} days",)
+            )
+            return positions, completions, daily
+
+    stats = {'positions': {}, 'completions': {}, 'daily_active': {}}
+    for positions, completions, daily in await _fan_out(query):
+        for module, submodule, page, users in positions:
+            key = (module, submodule, page)
+            stats['positions'][key] = stats['positions'].get(key, 0) + users
+        for module, users in completions:
+            stats['completions'][module] = stats['completions'].get(module, 0) + users
+        for day, users in daily:
+            stats['daily_active'][day] = stats['daily_active'].get(day, 0) + users
+    return stats
+
+async def load_media_file_ids() -> Dict[str, Tuple[str, str]]:
+    """Все сохраненные file_id: {путь: (хэш содержимого, file_id)}"""
+    async with _connect(0) as db:
+        rows = await db.execute_fetchall(
+            "SELECT path, content_hash, file_id FROM media_cache"
+        )
+    return {row[0]: (row[1], row[2]) for row in rows}
+
+async def save_media_file_id(path: str, content_hash: str, file_id: str) -> None:
+    """Сохраняет file_id картинки для пути и версии содержимого"""
+    async with _connect(0) as db:
+        await db.execute("""
+            INSERT INTO media_cache (path, content_hash, file_id, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                content_hash = excluded.content_hash,
+                file_id = excluded.file_id,
+                updated_at = excluded.updated_at
+        """, (path, content_hash, file_id, _now()))
+        await db.commit()
+
+async def delete_media_file_id(path: str) -> None:
+    async with _connect(0) as db:
+        await db.execute("DELETE FROM media_cache WHERE path = ?", (path,))
+        await db.commit()
+
+async def create_broadcast(text: str, days: int, parse_mode: Optional[str] = None) -> int:
+    """Создает рассылку активным за days дней пользователям, возвращает ее id"""
+    async with _connect(0) as db:
         cursor = await db.execute(
-            "SELECT current_module, current_submodule, current_page, completed_modules, last_active "
-            "FROM user_progress WHERE user_id = ?",
-            (user_id,)
+            "INSERT INTO broadcasts (text, parse_mode, days, created_at) VALUES (?, ?, ?, ?)",
+            (text, parse_mode, days, _now())
+        )
+        await db.commit()
+        return cursor.lastrowid
+
+async def get_broadcast(broadcast_id: int) -> Optional[dict]:
+    """Рассылка со счетчиками доставки по статусам (sent, blocked, failed)"""
+    async with _connect(0) as db:
+        cursor = await db.execute(
+            "SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,)
         )
         row = await cursor.fetchone()
-        
-        if row:
-            return {
-                'current_module': row[0] if row[0] is not None else 1,
-                'current_submodule': row[1] if row[1] is not None else 1,
-                'current_page': row[2] if row[2] is not None else 1,
-                'completed_modules': json.loads(row[3]) if row[3] else [],
-                'last_active': row[4] if row[4] is not None else None
-            }
-        else:
-            # Создаем запись, если пользователя нет в базе
+        if row is None:
+            return None
+        counts = await db.execute_fetchall("""
+            SELECT status, COUNT(*) FROM broadcast_deliveries
+            WHERE broadcast_id = ? GROUP BY status
+        """, (broadcast_id,))
+    broadcast = dict(row)
+    broadcast['deliveries'] = {status: count for status, count in counts}
+    return broadcast
+
+async def get_broadcast_ids(status: str) -> List[int]:
+    async with _connect(0) as db:
+        rows = await db.execute_fetchall(
+            "SELECT id FROM broadcasts WHERE status = ? ORDER BY id", (status,)
+        )
+    return [row[0] for row in rows]
+
+async def set_broadcast_status(broadcast_id: int, status: str) -> None:
+    async with _connect(0) as db:
+        await db.execute(
+            "UPDATE broadcasts SET status = ?, finished_at = ? WHERE id = ?",
+            (status, _now() if status in ('done', 'cancelled') else None, broadcast_id)
+        )
+        await db.commit()
+
+async def get_delivered_users(broadcast_id: int, first_user_id: int, last_user_id: int) -> set:
+    """Получатели из диапазона user_id, доставка которым уже записана"""
+    async with _connect(0) as db:
+        rows = await db.execute_fetchall("""
+            SELECT user_id FROM broadcast_deliveries
+            WHERE broadcast_id = ? AND user_id BETWEEN ? AND ?
+        """, (broadcast_id, first_user_id, last_user_id))
+    return {row[0] for row in rows}
+
+async def record_broadcast_deliveries(
+    broadcast_id: int,
+    deliveries: List[Tuple[int, str, Optional[str], int]],
+    cursor_user_id: Optional[int] = None
+) -> None:
+    """Записывает результаты доставки (user_id, статус, ошибка, время) и, если
+    задан, курсор: все получатели с user_id <= cursor_user_id обработаны"""
+    async with _connect(0) as db:
+        await db.executemany("""
+            INSERT OR IGNORE INTO broadcast_deliveries
+                (broadcast_id, user_id, status, error, sent_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(broadcast_id, *delivery) for delivery in deliveries])
+        if cursor_user_id is not None:
             await db.execute(
-                "INSERT INTO user_progress (user_id) VALUES (?)",
-                (user_id,)
+                "UPDATE broadcasts SET cursor_user_id = MAX(cursor_user_id, ?) WHERE id = ?",
+                (cursor_user_id, broadcast_id)
             )
+        await db.commit()
+
+async def load_fsm_state(
+    user_id: int, key: str, not_before: int
+) -> Optional[Tuple[Optional[str], Optional[bytes], int]]:
+    """Состояние FSM (state, data, updated_at), если оно менялось не раньше not_before"""
+    async with _connect(shard_for(user_id)) as db:
+        cursor = await db.execute(
+            "SELECT state, data, updated_at FROM fsm_states WHERE key = ? AND updated_at >= ?",
+            (key, not_before)
+        )
+        row = await cursor.fetchone()
+    return tuple(row) if row is not None else None
+
+async def write_fsm_states(
+    rows: List[Tuple[int, str, Optional[str], Optional[bytes], int]]
+) -> None:
+    """Записывает пачку состояний FSM (user_id, key, state, data, updated_at):
+    по одной транзакции на шард, шарды параллельно. Пустые состояния удаляются."""
+    by_shard: Dict[int, Tuple[list, list]] = {}
+    for user_id, key, state, data, updated_at in rows:
+        upserts, deletes = by_shard.setdefault(shard_for(user_id), ([], []))
+        if state is None and data is None:
+            deletes.append((key,))
+        else:
+            upserts.append((key, state, data, updated_at))
+
+    async def write(shard: int, upserts: list, deletes: list) -> None:
+        async with _connect(shard) as db:
+            if upserts:
+                await db.executemany("""
+                    INSERT INTO fsm_states (key, state, data, updated_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        state = excluded.state,
+                        data = excluded.data,
+                        updated_at = excluded.updated_at
+                """, upserts)
+            if deletes:
+                await db.executemany("DELETE FROM fsm_states WHERE key = ?", deletes)
             await db.commit()
-            return {
-                'current_module': 1,
-                'current_submodule': 1,
-                'current_page': 1,
-                'completed_modules': [],
-                'last_active': None
-            }
-
-async def backup_database(backup_path: str) -> None:
-    """Создание резервной копии базы данных"""
-    async with aiosqlite.connect(DATABASE_PATH) as source:
-        async with aiosqlite.connect(backup_path) as target:
-            await source.backup(target)
\ No newline at end of file
+
+    await asyncio.gather(*(
+        write(shard, upserts, deletes) for shard, (upserts, deletes) in by_shard.items()
+    ))
+
+async def purge_fsm_states(before: int) -> int:
+    """Удаляет состояния FSM, не менявшиеся с момента before; возвращает их число"""
+    async def purge(shard: int) -> int:
+        async with _connect(shard) as db:
+            cursor = await db.execute("DELETE FROM fsm_states WHERE updated_at < ?", (before,))
+            await db.commit()
+            return cursor.rowcount
+    return sum(await _fan_out(purge))
+
+def backup_paths(backup_path: str) -> List[str]:
+    """Файлы резервной копии: по одному на шард (суффикс .N при нескольких шардах)"""
+    if SHARD_COUNT == 1:
+        return [str(backup_path)]
+    return [f"{backup_path}.{shard}" for shard in range(SHARD_COUNT)]
+
+async def backup_database(
+    backup_path: str,
+    pages: int = 256,
+    sleep: float = 0.05,
+    progress: Optional[Callable[[int, int, int], None]] = None
+) -> None:
+    """Создание резервной копии базы данных (всех шардов).
+
+    Копирование идет порциями по pages страниц с паузой sleep секунд между
+    ними, чтобы не задерживать запись. progress(shard, remaining, total)
+    вызывается после каждой порции из потока соединения."""
+    async def backup(shard: int) -> None:
+        def on_step(status: int, remaining: int, total: int) -> None:
+            if progress is not None:
+                progress(shard, remaining, total)
+            # sqlite3 сам спит только при SQLITE_BUSY, поэтому пауза между
+            # порциями - здесь, в потоке соединения, вне цикла событий
+            if remaining and sleep:
+                time.sleep(sleep)
+
+        # Отдельные соединения, чтобы копия не занимала соединения пула
+        async with aiosqlite.connect(shard_paths()[shard]) as source:
+            # Читающая транзакция фиксирует снимок WAL: запись в других
+            # соединениях продолжается и не перезапускает копирование
+            await source.execute("BEGIN")
+            await source.execute_fetchall("SELECT COUNT(*) FROM sqlite_master")
+            async with aiosqlite.connect(backup_paths(backup_path)[shard]) as target:
+                await source.backup(target, pages=pages, progress=on_step)
+            await source.rollback()
+
+    await _fan_out(backup)
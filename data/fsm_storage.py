@@ -0,0 +1,229 @@
+"""Хранилище FSM aiogram в SQLite.
+
+Состояния живут в таблице fsm_states шарда пользователя (data/database.py),
+поэтому переживают перезапуск бота. Горячая часть держится в памяти:
+LRU не больше maxsize ключей, включая отрицательные записи "состояния нет"
+(aiogram читает состояние на каждом обновлении). Запись отложенная: последняя
+версия каждого ключа сбрасывается пачкой фоновым буфером, как прогресс
+в write_behind.py. Состояние, не менявшееся дольше ttl, считается пустым,
+а его строка удаляется периодической очисткой.
+
+Кэш не сверяется с базой, поэтому хранилищем пользуется один процесс бота
+(см. services/webhook.py): записи другого процесса он не увидит.
+
+data хранится компактно: b"j" + JSON без пробелов или b"z" + zlib(JSON),
+если так короче.
+"""
+import asyncio
+import json
+import logging
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import DEFAULT_DESTINY, BaseStorage, StateType, StorageKey
+
+from data.database import load_fsm_state, purge_fsm_states, write_fsm_states
+from data.write_behind import BackgroundFlusher
+
+logger = logging.getLogger(__name__)
+
+# Меньше этого размера JSON не сжимаем: заголовок zlib съест выигрыш
+COMPRESS_MIN_SIZE = 128
+
+
+def encode_data(data: Mapping[str, Any]) -> Optional[bytes]:
+    if not data:
+        return None
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+    if len(raw) >= COMPRESS_MIN_SIZE:
+        packed = zlib.compress(raw, 6)
+        if len(packed) < len(raw):
+            return b"z" + packed
+    return b"j" + raw
+
+
+def decode_data(blob: Optional[bytes]) -> Dict[str, Any]:
+    if not blob:
+        return {}
+    kind, body = blob[:1], blob[1:]
+    if kind == b"z":
+        body = zlib.decompress(body)
+    elif kind != b"j":
+        raise ValueError(f"Неизвестный формат данных FSM: {kind!r}")
+    return json.loads(body)
+
+
+def storage_key(key: StorageKey) -> str:
+    """Строковый ключ строки fsm_states"""
+    parts = [str(key.bot_id), str(key.chat_id), str(key.user_id)]
+    if key.thread_id is not None:
+        parts.append(f"t{key.thread_id}")
+    if key.business_connection_id is not None:
+        parts.append(f"b{key.business_connection_id}")
+    if key.destiny != DEFAULT_DESTINY:
+        parts.append(f"d{key.destiny}")
+    return ":".join(parts)
+
+
+class FsmEntry:
+    """Состояние и данные одного ключа; updated_at - время Unix последней записи"""
+    __slots__ = ("user_id", "state", "data", "updated_at")
+
+    def __init__(self, user_id: int, state: Optional[str] = None,
+                 data: Optional[Dict[str, Any]] = None, updated_at: int = 0) -> None:
+        self.user_id = user_id
+        self.state = state
+        self.data = data or {}
+        self.updated_at = updated_at
+
+    @property
+    def is_empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class FsmWriteBuffer(BackgroundFlusher):
+    """Отложенная запись состояний: последняя версия каждого ключа, пачкой"""
+
+    def __init__(self, interval: float = 1.0, max_entries: int = 500,
+                 ttl: float = 86400.0, purge_interval: float = 3600.0) -> None:
+        super().__init__(interval)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._pending: Dict[str, FsmEntry] = {}
+        self._inflight: Dict[str, FsmEntry] = {}
+        self._flush_lock = asyncio.Lock()
+        self._purged_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._pending) + len(self._inflight)
+
+    def put(self, key: str, entry: FsmEntry) -> None:
+        self._pending[key] = entry
+        if len(self._pending) >= self.max_entries:
+            self._full.set()
+
+    def peek(self, key: str) -> Optional[FsmEntry]:
+        """Незаписанная версия ключа, включая сбрасываемую сейчас"""
+        entry = self._pending.get(key)
+        return entry if entry is not None else self._inflight.get(key)
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            self._full.clear()
+            if self._pending:
+                self._inflight, self._pending = self._pending, {}
+                # Кодируем сразу: словари в кэше могут поменяться во время записи
+                rows = [
+                    (entry.user_id, key, entry.state, encode_data(entry.data), entry.updated_at)
+                    for key, entry in self._inflight.items()
+                ]
+                try:
+                    await write_fsm_states(rows)
+                except Exception as e:
+                    logger.error(f"Ошибка записи состояний FSM: {e}")
+                    # Возвращаем в очередь, не затирая более свежие версии
+                    for key, entry in self._inflight.items():
+                        self._pending.setdefault(key, entry)
+                finally:
+                    self._inflight = {}
+            if time.monotonic() - self._purged_at >= self.purge_interval:
+                self._purged_at = time.monotonic()
+                try:
+                    purged = await purge_fsm_states(int(time.time() - self.ttl))
+                    if purged:
+                        logger.info(f"Удалено устаревших состояний FSM: {purged}")
+                except Exception as e:
+                    logger.error(f"Ошибка очистки состояний FSM: {e}")
+
+
+class SQLiteStorage(BaseStorage):
+    """BaseStorage aiogram поверх базы бота с LRU в памяти и отложенной записью"""
+
+    def __init__(self, maxsize: int = 100_000, ttl: float = 86400.0,
+                 flush_interval: float = 1.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self._entries: "OrderedDict[str, FsmEntry]" = OrderedDict()
+        self._buffer = FsmWriteBuffer(interval=flush_interval, ttl=ttl)
+
+    def _remember(self, key: str, entry: FsmEntry) -> FsmEntry:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def _fresh(self, key: str, entry: FsmEntry) -> FsmEntry:
+        """Истекшее состояние заменяется пустым (строку удалит очистка)"""
+        if not entry.is_empty and entry.updated_at < time.time() - self.ttl:
+            self.expired += 1
+            return self._remember(key, FsmEntry(entry.user_id))
+        return entry
+
+    async def _entry(self, key: StorageKey) -> FsmEntry:
+        name = storage_key(key)
+        entry = self._entries.get(name)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(name)
+            return self._fresh(name, entry)
+        self.misses += 1
+        # Вытеснена из кэша, но еще не записана
+        entry = self._buffer.peek(name)
+        if entry is None:
+            row = await load_fsm_state(key.user_id, name, int(time.time() - self.ttl))
+            # Пока читали базу, ключ мог быть записан: свежая версия уже в кэше
+            # (или в буфере, если ее успели вытеснить)
+            cached = self._entries.get(name) or self._buffer.peek(name)
+            if cached is not None:
+                return self._fresh(name, self._remember(name, cached))
+            if row is None:
+                entry = FsmEntry(key.user_id)
+            else:
+                state, data, updated_at = row
+                entry = FsmEntry(key.user_id, state, decode_data(data), updated_at)
+        return self._fresh(name, self._remember(name, entry))
+
+    def _write(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]) -> None:
+        name = storage_key(key)
+        entry = self._remember(name, FsmEntry(key.user_id, state, data, int(time.time())))
+        self._buffer.put(name, entry)
+        if not self._buffer.is_running:
+            self._buffer.start()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._entry(key)
+        self._write(key, state.state if isinstance(state, State) else state, entry.data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._entry(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        entry = await self._entry(key)
+        self._write(key, entry.state, dict(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict((await self._entry(key)).data)
+
+    async def close(self) -> None:
+        """Записывает отложенные состояния (вызывается при остановке диспетчера)"""
+        await self._buffer.stop()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expired': self.expired,
+            'pending': len(self._buffer)
+        }
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Union
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """Пул долгоживущих соединений с SQLite (WAL, busy timeout, кэш запросов)"""
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        size: int = 4,
+        busy_timeout: float = 5.0,
+        cached_statements: int = 256
+    ) -> None:
+        self.path = path
+        self.size = size
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._connections: List[aiosqlite.Connection] = []
+        self._idle: Optional[asyncio.Queue] = None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            cached_statements=self.cached_statements
+        )
+        db.row_factory = aiosqlite.Row
+        await db.execute("PRAGMA journal_mode = WAL")
+        await db.execute("PRAGMA synchronous = NORMAL")
+        await db.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+        return db
+
+    async def open(self) -> None:
+        """Открывает все соединения пула"""
+        if self._idle is not None:
+            return
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            db = await self._connect()
+            self._connections.append(db)
+            self._idle.put_nowait(db)
+        logger.info(f"Пул SQLite открыт: {self.path} ({self.size} соединений)")
+
+    async def close(self) -> None:
+        """Закрывает все соединения пула"""
+        if self._idle is None:
+            return
+        connections, self._connections = self._connections, []
+        self._idle = None
+        for db in connections:
+            try:
+                await db.close()
+            except Exception as e:
+                logger.warning(f"Ошибка закрытия соединения: {e}")
+        logger.info(f"Пул SQLite закрыт: {self.path}")
+
+    @property
+    def is_open(self) -> bool:
+        return self._idle is not None
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Выдает свободное соединение и возвращает его в пул после использования"""
+        if self._idle is None:
+            raise RuntimeError("Пул соединений не открыт")
+        idle = self._idle
+        db = await idle.get()
+        try:
+            yield db
+        finally:
+            # Незавершенная транзакция не должна достаться следующему владельцу
+            if db.in_transaction:
+                try:
+                    await db.rollback()
+                except Exception as e:
+                    logger.warning(f"Ошибка отката транзакции: {e}")
+            idle.put_nowait(db)
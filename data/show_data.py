@@ -1,29 +1,349 @@
-import sqlite3
+"""Потоковая выгрузка таблицы user_progress.
+
+Строки читаются курсором порциями фиксированного размера, поэтому память
+не зависит от числа пользователей. Примеры (из корня проекта):
+
+    python data/show_data.py --format table --limit 20
+    python data/show_data.py --format csv -o progress.csv
+    python data/show_data.py --format jsonl --completed 3 --active-since 2025-05-01
+    python data/show_data.py --format columnar -o progress.col
+"""
+import argparse
+import csv
 import json
-from tabulate import tabulate
+import sqlite3
+import struct
+import sys
+import time
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+BASE_DIR = Path(__file__).parent.parent
+DEFAULT_DB = Path(__file__).parent / "user_progress.db"
+
+COLUMNS = [
+    ("user_id", "int"),
+    ("current_module", "int"),
+    ("current_submodule", "int"),
+    ("current_page", "int"),
+    ("completed_mask", "int"),
+    ("last_active", "int"),
+]
+
+# Колоночный формат: MAGIC, uint32 длина + JSON-заголовок со списком колонок,
+# затем блоки: uint32 число строк и данные по колонкам подряд
+# (int -> 1 байт typecode array ('b'/'h'/'i'/'q') + значения LE наименьшей
+# подходящей для блока ширины; str -> uint32 LE длины строк + UTF-8 байты).
+# Блок с нулем строк завершает файл.
+MAGIC = b"WSPCOL1\n"
+INT_TYPECODES = ("b", "h", "i", "q")
+
+
+def narrowest_typecode(values: Sequence[int]) -> str:
+    """Наименьший знаковый тип array, вмещающий все значения блока"""
+    low, high = min(values), max(values)
+    for code in INT_TYPECODES:
+        bits = array(code).itemsize * 8
+        if -(1 << (bits - 1)) <= low and high < 1 << (bits - 1):
+            return code
+    raise OverflowError("Значение не помещается в int64")
+
+
+def default_db_paths() -> List[Path]:
+    """Файлы базы по DB_SHARDS из config.py, как data.database.shard_paths():
+    основной файл при одном шарде, иначе файлы шардов"""
+    # При запуске как python data/show_data.py корня проекта нет в sys.path
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    from config import DB_SHARDS
+    if DB_SHARDS == 1:
+        return [DEFAULT_DB]
+    return [DEFAULT_DB.with_name(f"{DEFAULT_DB.stem}.{i}{DEFAULT_DB.suffix}") for i in range(DB_SHARDS)]
+
+
+def to_epoch(value: str) -> int:
+    """'2025-05-01' или '2025-05-01 12:00:00' (UTC) -> секунды Unix"""
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
 
-def fetch_user_progress(db_path="data/user_progress.db"):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
 
-    cursor.execute("SELECT * FROM user_progress")
-    rows = cursor.fetchall()
-    column_names = [description[0] for description in cursor.description]
+def to_iso(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
 
-    # Преобразование JSON в читаемый список
-    readable_rows = []
-    for row in rows:
-        row = list(row)
+
+def completed_modules(mask: int) -> List[int]:
+    return [bit + 1 for bit in range(mask.bit_length()) if mask >> bit & 1]
+
+
+# С этой версии схемы (PRAGMA user_version, миграции data/database.py)
+# last_active хранится секундами Unix, а завершенные модули - в completed_mask
+EPOCH_SCHEMA_VERSION = 3
+
+
+def _select_expressions(conn: sqlite3.Connection) -> Tuple[List[str], bool]:
+    """Выражения колонок COLUMNS для схемы этого файла и признак того, что
+    завершенные модули - JSON-список completed_modules (база до миграций)"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= EPOCH_SCHEMA_VERSION:
+        return [name for name, _ in COLUMNS], False
+    names = {row[1] for row in conn.execute("PRAGMA table_info(user_progress)")}
+    legacy_json = "completed_mask" not in names
+    return [
+        "user_id",
+        "COALESCE(current_module, 1)",
+        "COALESCE(current_submodule, 1)",
+        "COALESCE(current_page, 1)",
+        "completed_modules" if legacy_json else "completed_mask",
+        "COALESCE(CAST(strftime('%s', last_active) AS INTEGER), 0)",
+    ], legacy_json
+
+
+def _legacy_mask(completed_json: Optional[str]) -> int:
+    mask = 0
+    for module in json.loads(completed_json or "[]"):
+        mask |= 1 << (module - 1)
+    return mask
+
+
+def iter_chunks(
+    db_paths: Sequence[Path],
+    chunk_size: int = 5000,
+    active_since: Optional[str] = None,
+    active_until: Optional[str] = None,
+    module: Optional[int] = None,
+    completed: Optional[int] = None
+) -> Iterator[List[Tuple]]:
+    """Отдает строки user_progress порциями по chunk_size со всех файлов базы.
+    Файлы, которые бот еще не мигрировал, читаются по старой схеме."""
+    for path in db_paths:
+        conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
         try:
-            idx = column_names.index("completed_modules")
-            row[idx] = json.loads(row[idx]) if row[idx] else []
-        except:
-            pass
-        readable_rows.append(row)
+            expressions, legacy_json = _select_expressions(conn)
+            conditions, params = [], []
+            if active_since:
+                conditions.append(f"{expressions[5]} >= ?")
+                params.append(to_epoch(active_since))
+            if active_until:
+                conditions.append(f"{expressions[5]} < ?")
+                params.append(to_epoch(active_until))
+            if module is not None:
+                conditions.append(f"{expressions[1]} = ?")
+                params.append(module)
+            if completed is not None and not legacy_json:
+                conditions.append(f"{expressions[4]} & ? != 0")
+                params.append(1 << (completed - 1))
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            cursor = conn.execute(
+                f"SELECT {', '.join(expressions)} FROM user_progress {where} ORDER BY user_id",
+                params
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if legacy_json:
+                    # JSON-список завершенных модулей -> маска, фильтр по модулю здесь
+                    rows = [row[:4] + (_legacy_mask(row[4]), row[5]) for row in rows]
+                    if completed is not None:
+                        rows = [row for row in rows if row[4] >> (completed - 1) & 1]
+                    if not rows:
+                        continue
+                yield rows
+        finally:
+            conn.close()
+
+
+class CsvWriter:
+    def __init__(self, out: TextIO) -> None:
+        self._writer = csv.writer(out)
+        self._writer.writerow([
+            "user_id", "current_module", "current_submodule", "current_page",
+            "completed_modules", "last_active"
+        ])
+
+    def write(self, rows: List[Tuple]) -> None:
+        self._writer.writerows(
+            (r[0], r[1], r[2], r[3], ";".join(map(str, completed_modules(r[4]))), to_iso(r[5]))
+            for r in rows
+        )
+
+    def close(self) -> None:
+        pass
+
+
+class JsonlWriter:
+    def __init__(self, out: TextIO) -> None:
+        self._out = out
+
+    def write(self, rows: List[Tuple]) -> None:
+        self._out.writelines(
+            json.dumps({
+                "user_id": r[0],
+                "current_module": r[1],
+                "current_submodule": r[2],
+                "current_page": r[3],
+                "completed_modules": completed_modules(r[4]),
+                "last_active": to_iso(r[5])
+            }, ensure_ascii=False) + "\n"
+            for r in rows
+        )
+
+    def close(self) -> None:
+        pass
+
+
+class TableWriter:
+    """Простая таблица фиксированной ширины для просмотра в терминале"""
+
+    WIDTHS = (12, 8, 8, 6, 12, 20)
+
+    def __init__(self, out: TextIO) -> None:
+        self._out = out
+        self._line(("user_id", "module", "sub", "page", "completed", "last_active"))
+        self._out.write("-" * (sum(self.WIDTHS) + 3 * len(self.WIDTHS)) + "\n")
+
+    def _line(self, values: Sequence) -> None:
+        self._out.write(" | ".join(
+            str(value).ljust(width) for value, width in zip(values, self.WIDTHS)
+        ) + "\n")
+
+    def write(self, rows: List[Tuple]) -> None:
+        for r in rows:
+            done = ",".join(map(str, completed_modules(r[4]))) or "-"
+            self._line((r[0], r[1], r[2], r[3], done, to_iso(r[5])))
+
+    def close(self) -> None:
+        pass
+
+
+class ColumnarWriter:
+    """Компактный колоночный бинарный формат (см. MAGIC)"""
+
+    def __init__(self, out: BinaryIO) -> None:
+        self._out = out
+        header = json.dumps({"columns": COLUMNS}).encode()
+        out.write(MAGIC)
+        out.write(struct.pack("<I", len(header)))
+        out.write(header)
+
+    def write(self, rows: List[Tuple]) -> None:
+        self._out.write(struct.pack("<I", len(rows)))
+        for index, (_, kind) in enumerate(COLUMNS):
+            if kind == "int":
+                column = [r[index] for r in rows]
+                code = narrowest_typecode(column)
+                values = array(code, column)
+                if sys.byteorder == "big":
+                    values.byteswap()
+                self._out.write(code.encode())
+                self._out.write(values.tobytes())
+            else:
+                encoded = [r[index].encode() for r in rows]
+                lengths = array("I", (len(value) for value in encoded))
+                if sys.byteorder == "big":
+                    lengths.byteswap()
+                self._out.write(lengths.tobytes())
+                self._out.write(b"".join(encoded))
+
+    def close(self) -> None:
+        self._out.write(struct.pack("<I", 0))
+
+
+def read_columnar(src: BinaryIO) -> Iterator[dict]:
+    """Читает колоночный файл поблочно: {колонка: список значений}"""
+    if src.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Неизвестный формат файла")
+    (header_len,) = struct.unpack("<I", src.read(4))
+    columns = json.loads(src.read(header_len))["columns"]
+    while True:
+        (rows,) = struct.unpack("<I", src.read(4))
+        if rows == 0:
+            return
+        block = {}
+        for name, kind in columns:
+            if kind == "int":
+                values = array(src.read(1).decode())
+                values.frombytes(src.read(rows * values.itemsize))
+                if sys.byteorder == "big":
+                    values.byteswap()
+                block[name] = values.tolist()
+            else:
+                lengths = array("I")
+                lengths.frombytes(src.read(rows * 4))
+                if sys.byteorder == "big":
+                    lengths.byteswap()
+                data = src.read(sum(lengths))
+                strings, offset = [], 0
+                for length in lengths:
+                    strings.append(data[offset:offset + length].decode())
+                    offset += length
+                block[name] = strings
+        yield block
+
+
+WRITERS = {
+    "table": (TableWriter, False),
+    "csv": (CsvWriter, False),
+    "jsonl": (JsonlWriter, False),
+    "columnar": (ColumnarWriter, True),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Выгрузка прогресса пользователей")
+    parser.add_argument("--db", type=Path, nargs="+", help="файлы базы (по умолчанию все шарды)")
+    parser.add_argument("--format", choices=WRITERS, default="table")
+    parser.add_argument("-o", "--output", type=Path, help="файл вывода (по умолчанию stdout)")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--active-since", help="активны с даты (UTC), например 2025-05-01")
+    parser.add_argument("--active-until", help="активны до даты (UTC), не включая")
+    parser.add_argument("--module", type=int, help="текущий модуль пользователя")
+    parser.add_argument("--completed", type=int, help="пользователи, завершившие модуль")
+    parser.add_argument("--limit", type=int, help="не более N строк")
+    args = parser.parse_args()
+    if args.completed is not None and args.completed < 1:
+        parser.error("--completed: номер модуля начинается с 1")
+
+    writer_cls, binary = WRITERS[args.format]
+    if args.output:
+        out = open(args.output, "wb" if binary else "w", **({} if binary else {"newline": ""}))
+    else:
+        out = sys.stdout.buffer if binary else sys.stdout
+
+    started = time.perf_counter()
+    total = 0
+    writer = writer_cls(out)
+    try:
+        for rows in iter_chunks(
+            args.db or default_db_paths(),
+            chunk_size=args.chunk_size,
+            active_since=args.active_since,
+            active_until=args.active_until,
+            module=args.module,
+            completed=args.completed
+        ):
+            if args.limit is not None:
+                rows = rows[:args.limit - total]
+            if rows:
+                writer.write(rows)
+            total += len(rows)
+            if args.limit is not None and total >= args.limit:
+                break
+        writer.close()
+    finally:
+        if args.output:
+            out.close()
+        else:
+            out.flush()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Выгружено строк: {total} за {elapsed:.2f} с "
+        f"({total / elapsed if elapsed else 0:,.0f} строк/с)",
+        file=sys.stderr
+    )
 
-    conn.close()
-    return column_names, readable_rows
 
 if __name__ == "__main__":
-    headers, data = fetch_user_progress()
-    print(tabulate(data, headers=headers, tablefmt="grid"))
+    main()
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingProgress:
+    """Последняя еще не записанная позиция пользователя"""
+    module: Optional[int] = None
+    submodule: Optional[int] = None
+    page: Optional[int] = None
+    last_active: Optional[int] = None
+
+    def merge(self, newer: "PendingProgress") -> "PendingProgress":
+        """Накладывает более свежие значения поверх текущих"""
+        return PendingProgress(
+            module=newer.module if newer.module is not None else self.module,
+            submodule=newer.submodule if newer.submodule is not None else self.submodule,
+            page=newer.page if newer.page is not None else self.page,
+            last_active=newer.last_active or self.last_active
+        )
+
+
+FlushCallback = Callable[[List[Tuple[int, PendingProgress]]], Awaitable[None]]
+
+
+class BackgroundFlusher(ABC):
+    """Фоновый сброс буфера: по таймеру interval или сразу при переполнении"""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
+
+    @abstractmethod
+    async def flush(self) -> None:
+        """Записывает накопленное"""
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def start(self) -> None:
+        """Запускает фоновый сброс буфера"""
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает фоновый сброс и записывает остаток"""
+        # Не отменяем задачу посреди транзакции: просим цикл завершиться сам
+        task, self._task = self._task, None
+        if task is not None:
+            self._stopping = True
+            self._full.set()
+            await task
+        await self.flush()
+
+
+class ProgressWriteBuffer(BackgroundFlusher):
+    """Буфер отложенной записи: хранит последнюю позицию каждого пользователя
+    и сбрасывает накопленное одной транзакцией по таймеру или по объему"""
+
+    def __init__(
+        self,
+        flush_callback: FlushCallback,
+        interval: float = 0.3,
+        max_entries: int = 500
+    ) -> None:
+        super().__init__(interval)
+        self._flush_callback = flush_callback
+        self.max_entries = max_entries
+        self._pending: Dict[int, PendingProgress] = {}
+        self._inflight: Dict[int, PendingProgress] = {}
+        self._flush_lock = asyncio.Lock()
+
+    def put(self, user_id: int, entry: PendingProgress) -> None:
+        """Ставит позицию пользователя в очередь, склеивая с предыдущей"""
+        current = self._pending.get(user_id)
+        self._pending[user_id] = current.merge(entry) if current else entry
+        if len(self._pending) >= self.max_entries:
+            self._full.set()
+
+    def peek(self, user_id: int) -> Optional[PendingProgress]:
+        """Возвращает незаписанную позицию пользователя, включая сбрасываемую сейчас"""
+        inflight = self._inflight.get(user_id)
+        pending = self._pending.get(user_id)
+        if inflight and pending:
+            return inflight.merge(pending)
+        return pending or inflight
+
+    def discard(self, user_id: int) -> None:
+        """Отбрасывает незаписанную позицию (например, при сбросе прогресса)"""
+        self._pending.pop(user_id, None)
+
+    async def take(self, user_id: int) -> Optional[PendingProgress]:
+        """Дожидается текущего сброса и забирает позицию пользователя для прямой записи"""
+        async with self._flush_lock:
+            return self._pending.pop(user_id, None)
+
+    async def flush(self) -> None:
+        """Записывает все накопленные позиции одной транзакцией"""
+        async with self._flush_lock:
+            self._full.clear()
+            if not self._pending:
+                return
+            self._inflight, self._pending = self._pending, {}
+            try:
+                await self._flush_callback(list(self._inflight.items()))
+            except Exception as e:
+                logger.error(f"Ошибка сброса буфера прогресса: {e}")
+                # Возвращаем записи в очередь, не затирая более свежие
+                for user_id, entry in self._inflight.items():
+                    newer = self._pending.get(user_id)
+                    self._pending[user_id] = entry.merge(newer) if newer else entry
+            finally:
+                self._inflight = {}
+
+
+class AppendBuffer(BackgroundFlusher):
+    """Очередь строк только на добавление (журналы): add() не ждет диска,
+    накопленное пишется пачкой. При недоступной базе очередь ограничена
+    max_backlog строками, самые старые отбрасываются и учитываются в dropped."""
+
+    def __init__(
+        self,
+        flush_callback: Callable[[List[tuple]], Awaitable[None]],
+        interval: float = 1.0,
+        max_batch: int = 1000,
+        max_backlog: int = 100_000
+    ) -> None:
+        super().__init__(interval)
+        self._flush_callback = flush_callback
+        self.max_batch = max_batch
+        self.max_backlog = max_backlog
+        self.dropped = 0
+        self._rows: List[tuple] = []
+        self._flush_lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, row: tuple) -> None:
+        self._rows.append(row)
+        if len(self._rows) > self.max_backlog:
+            overflow = len(self._rows) - self.max_backlog
+            del self._rows[:overflow]
+            self.dropped += overflow
+        if len(self._rows) >= self.max_batch:
+            self._full.set()
+
+    async def flush(self) -> None:
+        """Записывает все накопленные строки"""
+        async with self._flush_lock:
+            self._full.clear()
+            if not self._rows:
+                return
+            batch, self._rows = self._rows, []
+            try:
+                await self._flush_callback(batch)
+            except Exception as e:
+                logger.error(f"Ошибка записи журнала: {e}")
+                self._rows[:0] = batch
@@ -0,0 +1,168 @@
+"""Компактные подписанные callback_data и маршрутизация по таблице.
+
+Кнопка несет не строку вида "test_answer_1_2_0_3", а упакованные байты:
+
+    версия (1 байт) | код действия (1 байт) | поля (struct) | HMAC (6 байт)
+
+в base64url без выравнивания (до ~20 символов при лимите Telegram в 64 байта).
+Подпись не дает подделать поля (например, номер вопроса) модифицированным
+клиентом, а проверка длины, версии и подписи отсекает мусор до разбора.
+
+Все нажатия принимает один обработчик router: он декодирует данные и берет
+обработчик из словаря по коду действия, без перебора фильтров всех роутеров.
+Обработчики регистрируются декоратором @on(ДЕЙСТВИЕ) и получают поля
+действия позиционными аргументами, а если объявлен параметр state - еще
+и FSMContext. Изменяемое состояние (счет теста) хранится в FSM, а не в кнопках.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import inspect
+import logging
+import struct
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import Router, types
+from aiogram.fsm.context import FSMContext
+from config import BOT_TOKEN, CALLBACK_SECRET
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+MAC_SIZE = 6
+
+Handler = Callable[..., Awaitable[None]]
+
+
+class CallbackAction:
+    """Тип кнопки: код в таблице маршрутизации и формат полей (struct, без знака)"""
+
+    def __init__(self, codec: "CallbackCodec", code: int, name: str, fields: str) -> None:
+        self.codec = codec
+        self.code = code
+        self.name = name
+        self.struct = struct.Struct("<" + fields)
+        self.size = 2 + self.struct.size + MAC_SIZE
+
+    def pack(self, *values: int) -> str:
+        """callback_data для кнопки с этими значениями полей"""
+        return self.codec.encode(self, values)
+
+    def __repr__(self) -> str:
+        return f"CallbackAction({self.name})"
+
+
+class CallbackCodec:
+    """Кодек callback_data с подписью HMAC-SHA256 (усеченной до MAC_SIZE байт)"""
+
+    def __init__(self, key: bytes) -> None:
+        self._key = key
+        self._actions: Dict[int, CallbackAction] = {}
+
+    def action(self, code: int, name: str, fields: str = "") -> CallbackAction:
+        if code in self._actions:
+            raise ValueError(f"Код действия {code} уже занят: {self._actions[code]}")
+        action = CallbackAction(self, code, name, fields)
+        self._actions[code] = action
+        return action
+
+    def _mac(self, payload: bytes) -> bytes:
+        return hmac.new(self._key, payload, hashlib.sha256).digest()[:MAC_SIZE]
+
+    def encode(self, action: CallbackAction, values: Tuple[int, ...]) -> str:
+        payload = bytes((VERSION, action.code)) + action.struct.pack(*values)
+        raw = payload + self._mac(payload)
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+    def decode(self, data: Optional[str]) -> Optional[Tuple[CallbackAction, tuple]]:
+        """(действие, поля) или None для чужих, устаревших и подделанных данных"""
+        if not data or len(data) > 64:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+        except (binascii.Error, ValueError):
+            return None
+        if len(raw) < 2 + MAC_SIZE or raw[0] != VERSION:
+            return None
+        action = self._actions.get(raw[1])
+        if action is None or len(raw) != action.size:
+            return None
+        payload, mac = raw[:-MAC_SIZE], raw[-MAC_SIZE:]
+        if not hmac.compare_digest(mac, self._mac(payload)):
+            return None
+        return action, action.struct.unpack_from(payload, 2)
+
+
+class CallbackDispatcher:
+    """Таблица код действия -> обработчик"""
+
+    def __init__(self, codec: CallbackCodec) -> None:
+        self.codec = codec
+        self._handlers: Dict[int, Handler] = {}
+        self._wants_state: Dict[int, bool] = {}
+
+    def on(self, action: CallbackAction) -> Callable[[Handler], Handler]:
+        def register(handler: Handler) -> Handler:
+            if action.code in self._handlers:
+                raise ValueError(f"Обработчик для {action} уже зарегистрирован")
+            self._handlers[action.code] = handler
+            self._wants_state[action.code] = "state" in inspect.signature(handler).parameters
+            return handler
+        return register
+
+    async def dispatch(self, callback: types.CallbackQuery,
+                       state: Optional[FSMContext] = None) -> bool:
+        """Вызывает обработчик нажатия; False, если данные не распознаны"""
+        decoded = self.codec.decode(callback.data)
+        if decoded is None:
+            return False
+        action, values = decoded
+        handler = self._handlers.get(action.code)
+        if handler is None:
+            return False
+        if self._wants_state[action.code]:
+            await handler(callback, *values, state=state)
+        else:
+            await handler(callback, *values)
+        return True
+
+
+def _secret() -> bytes:
+    # Без отдельного секрета подписываем ключом, производным от токена бота:
+    # кнопки в старых сообщениях остаются рабочими после перезапуска
+    if CALLBACK_SECRET:
+        return CALLBACK_SECRET.encode()
+    return hashlib.sha256(b"callback:" + BOT_TOKEN.encode()).digest()
+
+
+codec = CallbackCodec(_secret())
+callbacks = CallbackDispatcher(codec)
+on = callbacks.on
+
+# Действия кнопок. Коды не переиспользовать: они живут в уже отправленных сообщениях
+# Теория
+MODULE = codec.action(0x01, "module", "B")                    # module_id
+PAGE = codec.action(0x02, "page", "BBB")                      # module_id, submodule_id, page
+BACK_TO_MODULES = codec.action(0x03, "back_to_modules")
+# Тесты
+TEST_SELECT = codec.action(0x10, "test_select", "B")          # module_id
+# 0x11, 0x12 - старт и ответ со счетом в кнопке (до сессий теста в FSM)
+BACK_TO_TESTS = codec.action(0x13, "back_to_tests")
+TEST_START = codec.action(0x14, "test_start", "B")            # module_id
+TEST_ANSWER = codec.action(0x15, "test_answer", "BBB")        # module_id, q_index, option
+# Практика
+PRACTICE_MODULE = codec.action(0x20, "practice_module", "B")  # module_id
+PRACTICE_TASK = codec.action(0x21, "practice_task", "BB")     # module_id, task_index
+PRACTICE_BACK = codec.action(0x22, "practice_back")
+PRACTICE_LOCKED = codec.action(0x23, "practice_locked")
+
+router = Router()
+
+
+@router.callback_query()
+async def callback_handler(callback: types.CallbackQuery, state: FSMContext):
+    if not await callbacks.dispatch(callback, state):
+        # Кнопка из сообщения до смены формата или подделанные данные
+        logger.warning(f"Unknown callback data from {callback.from_user.id}: {callback.data!r}")
+        await callback.answer("Кнопка устарела, откройте меню заново", show_alert=True)
@@ -1,8 +1,19 @@
-from aiogram import Router, types
-from aiogram.filters import Command
+import logging
+from typing import Optional
+from aiogram import Router, types, F
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.utils.keyboard import ReplyKeyboardBuilder
+from config import ADMIN_IDS
+from content.index import get_module
+from data.database import create_broadcast, get_broadcast, get_course_stats
+from data.fsm_storage import SQLiteStorage
+from services.broadcast import cancel_broadcast, get_runner, start_broadcast
+from services.mailbox import mailbox
+from services.outbound import outbound
 
 router = Router()
+logger = logging.getLogger(__name__)
 
 def get_main_menu():
     builder = ReplyKeyboardBuilder()
@@ -21,4 +32,142 @@ async def cmd_start(message: types.Message):
     await message.answer(
         "Добро пожаловать в бота по обучению Wireshark!",
         reply_markup=get_main_menu()
-    )
\ No newline at end of file
+    )
+
+@router.message(Command("stats"), F.from_user.id.in_(ADMIN_IDS))
+async def cmd_stats(message: types.Message, fsm_storage: BaseStorage):
+    """Сводка по курсу для администраторов"""
+    try:
+        stats = await get_course_stats()
+
+        on_module = {}
+        for (module_id, _, _), users in stats['positions'].items():
+            on_module[module_id] = on_module.get(module_id, 0) + users
+
+        lines = ["📊 <b>Статистика курса</b>\n", "<u>Модули (сейчас изучают / завершили):</u>"]
+        for module_id in sorted(set(on_module) | set(stats['completions'])):
+            module = get_module(module_id)
+            title = module.title if module else f"Модуль {module_id}"
+            lines.append(
+                f"{title}: {on_module.get(module_id, 0)} / "
+                f"{stats['completions'].get(module_id, 0)}"
+            )
+
+        lines.append("\n<u>Активные пользователи по дням:</u>")
+        for day, users in sorted(stats['daily_active'].items()):
+            lines.append(f"{day}: {users}")
+
+        queue = outbound.stats()
+        lines.append("\n<u>Исходящие запросы:</u>")
+        lines.append(
+            f"В очереди: {queue['queued_interactive']} интерактивных, "
+            f"{queue['queued_bulk']} массовых"
+        )
+        lines.append(
+            f"Отправлено: {queue['sent']}, 429: {queue['retry_after']}, "
+            f"не доставлено: {queue['failed']}, среднее ожидание: {queue['avg_wait_ms']} мс"
+        )
+
+        updates = mailbox.stats()
+        lines.append("\n<u>Входящие обновления:</u>")
+        lines.append(
+            f"В очереди: {updates['queued']}, выполняется: {updates['in_flight']} "
+            f"(чатов: {updates['chats']}, макс. очередь чата: {updates['max_depth']})"
+        )
+        lines.append(
+            f"Обработано: {updates['processed']}, повторных нажатий: {updates['duplicates']}, "
+            f"отброшено: {updates['dropped']}"
+        )
+
+        if isinstance(fsm_storage, SQLiteStorage):
+            fsm = fsm_storage.stats()
+            lines.append("\n<u>Состояния FSM:</u>")
+            lines.append(
+                f"В памяти: {fsm['size']}, попаданий: {fsm['hits']}, промахов: {fsm['misses']}, "
+                f"вытеснено: {fsm['evictions']}, истекло: {fsm['expired']}, "
+                f"ждут записи: {fsm['pending']}"
+            )
+
+        await message.answer("\n".join(lines), parse_mode="HTML")
+    except Exception as e:
+        logger.error(f"Stats error: {e}")
+        await message.answer("⚠️ Ошибка загрузки статистики")
+
+BROADCAST_DEFAULT_DAYS = 365
+
+@router.message(Command("broadcast"), F.from_user.id.in_(ADMIN_IDS))
+async def cmd_broadcast(message: types.Message, command: CommandObject):
+    """/broadcast [дней] текст - рассылка пользователям, активным за N дней (HTML)"""
+    args = (command.args or "").strip()
+    days = BROADCAST_DEFAULT_DAYS
+    first, _, rest = args.partition(" ")
+    if first.isdigit() and rest.strip():
+        days, args = int(first), rest.strip()
+    if not args:
+        await message.answer("Использование: /broadcast [дней] текст")
+        return
+    try:
+        broadcast_id = await create_broadcast(args, days, parse_mode="HTML")
+        start_broadcast(message.bot, broadcast_id)
+        await message.answer(
+            f"📣 Рассылка #{broadcast_id} запущена (активные за {days} дн.)\n"
+            f"Статус: /broadcast_status {broadcast_id}\n"
+            f"Отмена: /broadcast_cancel {broadcast_id}"
+        )
+    except Exception as e:
+        logger.error(f"Broadcast error: {e}")
+        await message.answer("⚠️ Ошибка запуска рассылки")
+
+def _broadcast_id(command: CommandObject) -> Optional[int]:
+    """Номер рассылки из аргумента команды или None"""
+    args = (command.args or "").strip()
+    return int(args) if args.isdigit() else None
+
+@router.message(Command("broadcast_status"), F.from_user.id.in_(ADMIN_IDS))
+async def cmd_broadcast_status(message: types.Message, command: CommandObject):
+    """/broadcast_status id - ход рассылки"""
+    broadcast_id = _broadcast_id(command)
+    if broadcast_id is None:
+        await message.answer("Использование: /broadcast_status id")
+        return
+    try:
+        broadcast = await get_broadcast(broadcast_id)
+        if broadcast is None:
+            await message.answer(f"Рассылка #{broadcast_id} не найдена")
+            return
+        deliveries = broadcast['deliveries']
+        lines = [
+            f"📣 Рассылка #{broadcast_id}: {broadcast['status']}",
+            f"Доставлено: {deliveries.get('sent', 0)}, "
+            f"заблокировали бота: {deliveries.get('blocked', 0)}, "
+            f"ошибок: {deliveries.get('failed', 0)}"
+        ]
+        runner = get_runner(broadcast_id)
+        if runner is not None:
+            stats = runner.stats()
+            lines.append(f"Скорость: {stats['rate']} сообщений/с, идет {stats['elapsed']} с")
+        await message.answer("\n".join(lines))
+    except Exception as e:
+        logger.error(f"Broadcast status error: {e}")
+        await message.answer("⚠️ Ошибка загрузки статуса рассылки")
+
+@router.message(Command("broadcast_cancel"), F.from_user.id.in_(ADMIN_IDS))
+async def cmd_broadcast_cancel(message: types.Message, command: CommandObject):
+    """/broadcast_cancel id - остановка рассылки без продолжения после перезапуска"""
+    broadcast_id = _broadcast_id(command)
+    if broadcast_id is None:
+        await message.answer("Использование: /broadcast_cancel id")
+        return
+    try:
+        broadcast = await get_broadcast(broadcast_id)
+        if broadcast is None:
+            await message.answer(f"Рассылка #{broadcast_id} не найдена")
+            return
+        if broadcast['status'] in ('done', 'cancelled'):
+            await message.answer(f"Рассылка #{broadcast_id} уже завершена ({broadcast['status']})")
+            return
+        await cancel_broadcast(broadcast_id)
+        await message.answer(f"Рассылка #{broadcast_id} отменена")
+    except Exception as e:
+        logger.error(f"Broadcast cancel error: {e}")
+        await message.answer("⚠️ Ошибка отмены рассылки")
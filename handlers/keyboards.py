@@ -0,0 +1,316 @@
+"""Готовые inline-клавиатуры меню.
+
+Клавиатуры зависят только от содержимого курса, поэтому строятся один раз
+на каждый индекс content.index (при первом обращении после старта и заранее
+при перезагрузке содержимого) и дальше только выдаются из кэша.
+Клавиатуры со статусом модулей (✅/🔒) зависят лишь от набора завершенных
+модулей 1-5, поэтому заранее строятся все 2^5 вариантов, ключ - битовая маска
+(модуль N -> бит N-1, как completed_mask в базе).
+
+Разметки общие для всех пользователей: их нельзя изменять после выдачи.
+"""
+import logging
+import time
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, Mapping
+
+from aiogram import types
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from content.index import ContentIndex, derived, get_index, register_derived
+from handlers.callbacks import (
+    BACK_TO_MODULES, BACK_TO_TESTS, MODULE, PAGE, PRACTICE_BACK, PRACTICE_LOCKED,
+    PRACTICE_MODULE, PRACTICE_TASK, TEST_ANSWER, TEST_SELECT, TEST_START
+)
+
+logger = logging.getLogger(__name__)
+
+Markup = types.InlineKeyboardMarkup
+
+# Модули, у которых есть тест и практика (меню со статусом ✅/🔒)
+STATUS_MODULES = range(1, 6)
+STATUS_MASK = (1 << len(STATUS_MODULES)) - 1
+
+
+def completed_key(completed_modules: Iterable[int]) -> int:
+    """Маска завершенных модулей меню со статусом"""
+    mask = 0
+    for module_id in completed_modules:
+        if module_id in STATUS_MODULES:
+            mask |= 1 << (module_id - 1)
+    return mask
+
+
+# --- построение ---
+
+def _module_selection(index: ContentIndex) -> Markup:
+    builder = InlineKeyboardBuilder()
+    for module in index.modules:
+        builder.add(types.InlineKeyboardButton(
+            text=module.title,
+            callback_data=MODULE.pack(module.id)
+        ))
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+def _submodule_selection(index: ContentIndex, module_id: int) -> Markup:
+    builder = InlineKeyboardBuilder()
+    # Вертикальное расположение кнопок подразделов
+    for submodule in index.module(module_id).submodules:
+        builder.row(types.InlineKeyboardButton(
+            text=submodule.title,
+            callback_data=PAGE.pack(module_id, submodule.id, 1)
+        ))
+    # Кнопка "Назад" в отдельном ряду
+    builder.row(types.InlineKeyboardButton(
+        text="◀️ Назад к модулям",
+        callback_data=BACK_TO_MODULES.pack()
+    ))
+    return builder.as_markup()
+
+
+def _page_navigation(module_id: int, submodule_id: int, page: int, total_pages: int) -> Markup:
+    builder = InlineKeyboardBuilder()
+    if page > 1:
+        builder.add(types.InlineKeyboardButton(
+            text="⬅️ Назад",
+            callback_data=PAGE.pack(module_id, submodule_id, page - 1)
+        ))
+    if page < total_pages:
+        builder.add(types.InlineKeyboardButton(
+            text="Далее ➡️",
+            callback_data=PAGE.pack(module_id, submodule_id, page + 1)
+        ))
+    builder.row(types.InlineKeyboardButton(
+        text="📋 К списку тем",
+        callback_data=MODULE.pack(module_id)
+    ))
+    builder.adjust(2)
+    return builder.as_markup()
+
+
+def _test_selection(index: ContentIndex, mask: int) -> Markup:
+    builder = InlineKeyboardBuilder()
+    for module_id in STATUS_MODULES:
+        module = index.module(module_id)
+        if module is None:
+            continue
+        status = "✅" if mask >> (module_id - 1) & 1 else "🔒"
+        builder.add(types.InlineKeyboardButton(
+            text=f"{status} {module.title}",
+            callback_data=TEST_SELECT.pack(module_id)
+        ))
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+def _test_start(module_id: int) -> Markup:
+    return InlineKeyboardBuilder().add(
+        types.InlineKeyboardButton(
+            text="Начать тест",
+            callback_data=TEST_START.pack(module_id)
+        )
+    ).as_markup()
+
+
+def _question(index: ContentIndex, module_id: int, q_index: int) -> Markup:
+    builder = InlineKeyboardBuilder()
+    for i, option in enumerate(index.module_questions(module_id)[q_index].options):
+        builder.add(types.InlineKeyboardButton(
+            text=option,
+            callback_data=TEST_ANSWER.pack(module_id, q_index, i)
+        ))
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+def _test_result(module_id: int, passed: bool) -> Markup:
+    builder = InlineKeyboardBuilder()
+    builder.row(types.InlineKeyboardButton(
+        text="Вернуться к тестам",
+        callback_data=BACK_TO_TESTS.pack()
+    ))
+    if not passed:
+        builder.row(types.InlineKeyboardButton(
+            text="Попробовать снова",
+            callback_data=TEST_START.pack(module_id)
+        ))
+    return builder.as_markup()
+
+
+def _practice_menu(index: ContentIndex, mask: int) -> Markup:
+    builder = InlineKeyboardBuilder()
+    for module_id in STATUS_MODULES:
+        module = index.module(module_id)
+        if module is None:
+            continue
+        # Проверяем, завершен ли модуль
+        if mask >> (module_id - 1) & 1:
+            builder.add(types.InlineKeyboardButton(
+                text=f"✅ {module.title}",
+                callback_data=PRACTICE_MODULE.pack(module_id)
+            ))
+        else:
+            builder.add(types.InlineKeyboardButton(
+                text=f"🔒 {module.title}",
+                callback_data=PRACTICE_LOCKED.pack()
+            ))
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+def _module_tasks(index: ContentIndex, module_id: int) -> Markup:
+    builder = InlineKeyboardBuilder()
+    for i, task in enumerate(index.module_tasks(module_id), 1):
+        builder.add(types.InlineKeyboardButton(
+            text=f"Задание {i}: {task.title}",
+            callback_data=PRACTICE_TASK.pack(module_id, i - 1)
+        ))
+    builder.row(types.InlineKeyboardButton(
+        text="◀️ Назад к модулям",
+        callback_data=PRACTICE_BACK.pack()
+    ))
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+def _task_details(module_id: int) -> Markup:
+    builder = InlineKeyboardBuilder()
+    builder.row(types.InlineKeyboardButton(
+        text="◀️ Назад к заданиям",
+        callback_data=PRACTICE_MODULE.pack(module_id)
+    ))
+    return builder.as_markup()
+
+
+# --- кэш ---
+
+class KeyboardCache:
+    """Неизменяемые таблицы готовых клавиатур"""
+
+    def __init__(self, index: ContentIndex) -> None:
+        self.module_selection = _module_selection(index)
+        self.submodules = self._freeze({
+            module.id: _submodule_selection(index, module.id) for module in index.modules
+        })
+        self.pages = self._freeze({
+            (module.id, sub.id, page): _page_navigation(module.id, sub.id, page, len(sub.pages))
+            for module in index.modules
+            for sub in module.submodules
+            for page in range(1, len(sub.pages) + 1)
+        })
+        tests = [(module_id, questions) for module_id, questions in enumerate(index.questions, 1)
+                 if questions]
+        practice = [module_id for module_id, tasks in enumerate(index.tasks, 1) if tasks]
+        self.test_selection = self._freeze({
+            mask: _test_selection(index, mask) for mask in range(STATUS_MASK + 1)
+        })
+        self.test_start = self._freeze({
+            module_id: _test_start(module_id) for module_id, _ in tests
+        })
+        self.questions = self._freeze({
+            (module_id, q_index): _question(index, module_id, q_index)
+            for module_id, questions in tests
+            for q_index in range(len(questions))
+        })
+        self.test_results = self._freeze({
+            (module_id, passed): _test_result(module_id, passed)
+            for module_id, _ in tests for passed in (True, False)
+        })
+        self.practice_menu = self._freeze({
+            mask: _practice_menu(index, mask) for mask in range(STATUS_MASK + 1)
+        })
+        self.module_tasks = self._freeze({
+            module_id: _module_tasks(index, module_id) for module_id in practice
+        })
+        self.task_details = self._freeze({
+            module_id: _task_details(module_id) for module_id in practice
+        })
+
+    @staticmethod
+    def _freeze(table: Dict) -> Mapping:
+        return MappingProxyType(table)
+
+    def size(self) -> int:
+        tables = [
+            self.submodules, self.pages, self.test_selection, self.test_start,
+            self.questions, self.test_results, self.practice_menu,
+            self.module_tasks, self.task_details
+        ]
+        return 1 + sum(len(table) for table in tables)
+
+
+KEYBOARDS = "keyboards"
+
+
+def build_keyboards(index: ContentIndex) -> KeyboardCache:
+    """Строит все клавиатуры индекса (content.index, до его публикации)"""
+    started = time.perf_counter()
+    cache = KeyboardCache(index)
+    logger.info(
+        f"Клавиатуры построены: {cache.size()} за {(time.perf_counter() - started) * 1000:.0f} мс"
+    )
+    return cache
+
+
+register_derived(KEYBOARDS, build_keyboards)
+
+
+def _get() -> KeyboardCache:
+    return derived(KEYBOARDS)
+
+
+def _lookup(table: Mapping, key, build: Callable[[], Markup]) -> Markup:
+    # Ключ вне содержимого курса (например, страница сверх pages в modules.py)
+    markup = table.get(key)
+    return markup if markup is not None else build()
+
+
+# --- выдача ---
+
+def module_selection() -> Markup:
+    return _get().module_selection
+
+
+def submodule_selection(module_id: int) -> Markup:
+    return _lookup(_get().submodules, module_id, lambda: _submodule_selection(get_index(), module_id))
+
+
+def page_navigation(module_id: int, submodule_id: int, page: int, total_pages: int) -> Markup:
+    return _lookup(
+        _get().pages, (module_id, submodule_id, page),
+        lambda: _page_navigation(module_id, submodule_id, page, total_pages)
+    )
+
+
+def test_selection(completed_modules: Iterable[int]) -> Markup:
+    return _get().test_selection[completed_key(completed_modules)]
+
+
+def test_start(module_id: int) -> Markup:
+    return _lookup(_get().test_start, module_id, lambda: _test_start(module_id))
+
+
+def question(module_id: int, q_index: int) -> Markup:
+    return _lookup(
+        _get().questions, (module_id, q_index),
+        lambda: _question(get_index(), module_id, q_index)
+    )
+
+
+def test_result(module_id: int, passed: bool) -> Markup:
+    return _lookup(
+        _get().test_results, (module_id, passed), lambda: _test_result(module_id, passed)
+    )
+
+
+def practice_menu(completed_modules: Iterable[int]) -> Markup:
+    return _get().practice_menu[completed_key(completed_modules)]
+
+
+def module_tasks(module_id: int) -> Markup:
+    return _lookup(_get().module_tasks, module_id, lambda: _module_tasks(get_index(), module_id))
+
+
+def task_details(module_id: int) -> Markup:
+    return _lookup(_get().task_details, module_id, lambda: _task_details(module_id))
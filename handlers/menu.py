@@ -1,5 +1,8 @@
 from aiogram import Router, types, F
 from aiogram.filters import Command
+from handlers.practice import show_practice_menu
+from handlers.tests import show_test_selection
+from handlers.theory import send_module_selection
 
 router = Router()
 
@@ -9,17 +12,14 @@ async def cmd_start(message: types.Message):
 
 @router.message(F.text == "📚 Теория")
 async def theory_menu(message: types.Message):
-    from handlers.theory import send_module_selection
     await send_module_selection(message)
 
 @router.message(F.text == "🔍 Практика")
 async def practice_menu(message: types.Message):
-    from handlers.practice import show_practice_menu
     await show_practice_menu(message)
 
 @router.message(F.text == "📝 Тесты")
 async def tests_menu(message: types.Message):
-    from handlers.tests import show_test_selection
     await show_test_selection(message)
 
 @router.message(F.text == "🔗 Ресурсы")
@@ -1,34 +1,30 @@
 import logging
-from aiogram import Router, types, F
-from aiogram.utils.keyboard import InlineKeyboardBuilder
-from content.modules import get_module, get_submodule
-from data.database import get_user_progress, update_user_progress
-from content.questions import QUESTIONS
+from datetime import datetime, timezone
+from typing import Optional
+from aiogram import Router, types
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from handlers import keyboards
+from handlers.callbacks import BACK_TO_TESTS, TEST_ANSWER, TEST_SELECT, TEST_START, on
+from content.index import get_module, get_questions
+from data.database import (
+    get_user_progress, update_user_progress, log_test_answer, log_test_attempt
+)
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+class TestSession(StatesGroup):
+    """Идет тест; данные сессии: module, q (текущий вопрос), score"""
+    answering = State()
+
 async def show_test_selection(message: types.Message):
     """Показывает список доступных тестов"""
     try:
-        builder = InlineKeyboardBuilder()
         completed = (await get_user_progress(message.from_user.id))['completed_modules']
-        
-        for module_id in range(1, 6):  # Для всех 5 модулей
-            module = get_module(module_id)
-            if not module:
-                continue
-                
-            status = "✅" if module_id in completed else "🔒"
-            builder.add(types.InlineKeyboardButton(
-                text=f"{status} {module['title']}",
-                callback_data=f"test_select_{module_id}"
-            ))
-        
-        builder.adjust(1)
         await message.answer(
             "📝 Выберите тест для прохождения:",
-            reply_markup=builder.as_markup()
+            reply_markup=keyboards.test_selection(completed)
         )
     except Exception as e:
         logger.error(f"Test selection error: {e}")
@@ -42,65 +38,94 @@ async def start_test(callback: types.CallbackQuery, module_id: int):
             await callback.answer("Модуль не найден")
             return
 
-        questions = QUESTIONS.get(module_id, [])
+        questions = get_questions(module_id)
         if not questions:
             await callback.answer("Тест для этого модуля пока недоступен")
             return
 
         await callback.message.edit_text(
-            f"🧠 Тест: {module['title']}\n\n"
+            f"🧠 Тест: {module.title}\n\n"
             f"Количество вопросов: {len(questions)}\n"
             "Нажмите 'Начать', чтобы приступить к тестированию.",
-            reply_markup=InlineKeyboardBuilder().add(
-                types.InlineKeyboardButton(
-                    text="Начать тест",
-                    callback_data=f"test_start_{module_id}_0_0"  # module_id, q_index, score
-                )
-            ).as_markup()
+            reply_markup=keyboards.test_start(module_id)
         )
     except Exception as e:
         logger.error(f"Test start error: {e}")
         await callback.answer("⚠️ Ошибка запуска теста")
 
-async def show_question(callback: types.CallbackQuery, module_id: int, q_index: int, score: int):
+async def begin_test(callback: types.CallbackQuery, module_id: int, state: FSMContext):
+    """Открывает сессию теста в FSM и показывает первый вопрос"""
+    if not get_questions(module_id):
+        await callback.answer("Тест для этого модуля пока недоступен")
+        return
+    await state.set_state(TestSession.answering)
+    await state.set_data({'module': module_id, 'q': 0, 'score': 0})
+    await show_question(callback, module_id, 0)
+
+async def show_question(callback: types.CallbackQuery, module_id: int, q_index: int):
     """Показывает вопрос теста"""
     try:
-        questions = QUESTIONS.get(module_id, [])
-        if q_index >= len(questions):
-            await finish_test(callback, module_id, score)
-            return
-
+        questions = get_questions(module_id)
         question = questions[q_index]
-        builder = InlineKeyboardBuilder()
-
-        for i, option in enumerate(question['options']):
-            builder.add(types.InlineKeyboardButton(
-                text=option,
-                callback_data=f"test_answer_{module_id}_{q_index}_{score}_{i}"
-            ))
-        
-        builder.adjust(1)
         await callback.message.edit_text(
-            f"❓ Вопрос {q_index + 1}/{len(questions)}\n\n{question['text']}",
-            reply_markup=builder.as_markup()
+            f"❓ Вопрос {q_index + 1}/{len(questions)}\n\n{question.text}",
+            reply_markup=keyboards.question(module_id, q_index)
         )
     except Exception as e:
         logger.error(f"Question show error: {e}")
         await callback.answer("⚠️ Ошибка загрузки вопроса")
 
-async def handle_answer(callback: types.CallbackQuery, module_id: int, q_index: int, score: int, answer_idx: int):
+def _answer_latency_ms(message) -> Optional[int]:
+    """Время от показа вопроса (последней правки сообщения) до ответа"""
+    shown_at = getattr(message, 'edit_date', None) or getattr(message, 'date', None)
+    if not isinstance(shown_at, datetime) or shown_at.timestamp() <= 0:
+        return None
+    return max(0, int((datetime.now(timezone.utc) - shown_at).total_seconds() * 1000))
+
+async def handle_answer(
+    callback: types.CallbackQuery, module_id: int, q_index: int, answer_idx: int, state: FSMContext
+):
     """Обрабатывает ответ пользователя"""
     try:
-        questions = QUESTIONS.get(module_id, [])
+        session = await state.get_data()
+        if not session:
+            # Сессия истекла (FSM_TTL_HOURS) или тест уже завершен
+            await callback.answer("Сессия теста истекла, начните тест заново", show_alert=True)
+            await start_test(callback, module_id)
+            return
+        if session.get('module') != module_id or session.get('q') != q_index:
+            # Повторное нажатие или кнопка из предыдущего вопроса
+            await callback.answer("Ответ уже принят")
+            return
+
+        questions = get_questions(module_id)
         question = questions[q_index]
+        score = session['score'] + (answer_idx == question.correct)
+        finished = q_index + 1 >= len(questions)
+        # Сдвигаем сессию до первого ожидания: двойное нажатие не засчитается дважды
+        if finished:
+            await state.clear()
+        else:
+            await state.set_data({'module': module_id, 'q': q_index + 1, 'score': score})
         
-        if answer_idx == question['correct']:
-            score += 1
+        await log_test_answer(
+            user_id=callback.from_user.id,
+            module_id=module_id,
+            question_index=q_index,
+            option_index=answer_idx,
+            is_correct=answer_idx == question.correct,
+            latency_ms=_answer_latency_ms(callback.message)
+        )
+
+        if answer_idx == question.correct:
             await callback.answer("✅ Верно!")
         else:
-            await callback.answer("❌ Неверно! Правильный ответ: " + question['options'][question['correct']])
+            await callback.answer("❌ Неверно! Правильный ответ: " + question.options[question.correct])
         
-        await show_question(callback, module_id, q_index + 1, score)
+        if finished:
+            await finish_test(callback, module_id, score)
+        else:
+            await show_question(callback, module_id, q_index + 1)
     except Exception as e:
         logger.error(f"Answer handling error: {e}")
         await callback.answer("⚠️ Ошибка обработки ответа")
@@ -108,10 +133,18 @@ async def handle_answer(callback: types.CallbackQuery, module_id: int, q_index:
 async def finish_test(callback: types.CallbackQuery, module_id: int, score: int):
     """Завершает тест и показывает результаты с исправленной логикой"""
     try:
-        questions = QUESTIONS.get(module_id, [])
+        questions = get_questions(module_id)
         total = len(questions)
         percentage = int((score / total) * 100) if total > 0 else 0
         
+        await log_test_attempt(
+            user_id=callback.from_user.id,
+            module_id=module_id,
+            score=score,
+            total=total,
+            passed=percentage >= 70
+        )
+
         if percentage >= 70:
             result = (
                 "✅ <b>Тест пройден успешно!</b>\n\n"
@@ -135,26 +168,9 @@ async def finish_test(callback: types.CallbackQuery, module_id: int, score: int)
                 "Попробуйте изучить материал еще раз."
             )
         
-        # Создаем клавиатуру с кнопками
-        builder = InlineKeyboardBuilder()
-        builder.row(
-            types.InlineKeyboardButton(
-                text="Вернуться к тестам",
-                callback_data="back_to_tests"
-            )
-        )
-        
-        if percentage < 70:
-            builder.row(
-                types.InlineKeyboardButton(
-                    text="Попробовать снова",
-                    callback_data=f"test_start_{module_id}_0_0"
-                )
-            )
-        
         await callback.message.edit_text(
             result,
-            reply_markup=builder.as_markup(),
+            reply_markup=keyboards.test_result(module_id, percentage >= 70),
             parse_mode="HTML"
         )
         
@@ -163,21 +179,20 @@ async def finish_test(callback: types.CallbackQuery, module_id: int, score: int)
         await callback.answer("⚠️ Произошла ошибка при сохранении результатов")
 
 # Обработчики
-@router.callback_query(F.data.startswith("test_select_"))
-async def test_select_handler(callback: types.CallbackQuery):
-    module_id = int(callback.data.split("_")[2])
+@on(TEST_SELECT)
+async def test_select_handler(callback: types.CallbackQuery, module_id: int):
     await start_test(callback, module_id)
 
-@router.callback_query(F.data.startswith("test_start_"))
-async def test_start_handler(callback: types.CallbackQuery):
-    _, _, module_id, q_index, score = callback.data.split("_")
-    await show_question(callback, int(module_id), int(q_index), int(score))
+@on(TEST_START)
+async def test_start_handler(callback: types.CallbackQuery, module_id: int, state: FSMContext):
+    await begin_test(callback, module_id, state)
 
-@router.callback_query(F.data.startswith("test_answer_"))
-async def test_answer_handler(callback: types.CallbackQuery):
-    _, _, module_id, q_index, score, answer_idx = callback.data.split("_")
-    await handle_answer(callback, int(module_id), int(q_index), int(score), int(answer_idx))
+@on(TEST_ANSWER)
+async def test_answer_handler(
+    callback: types.CallbackQuery, module_id: int, q_index: int, answer_idx: int, state: FSMContext
+):
+    await handle_answer(callback, module_id, q_index, answer_idx, state)
 
-@router.callback_query(F.data == "back_to_tests")
+@on(BACK_TO_TESTS)
 async def back_to_tests_handler(callback: types.CallbackQuery):
     await show_test_selection(callback.message)
\ No newline at end of file
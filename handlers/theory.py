@@ -1,32 +1,85 @@
 import logging
-from pathlib import Path
-from aiogram import Router, types, F
-from aiogram.types import FSInputFile
-from aiogram.utils.keyboard import InlineKeyboardBuilder
-from content.modules import get_module, get_submodule, get_total_modules
-from content.texts import get_content
+from typing import Optional
+from aiogram import Router, types
+from aiogram.exceptions import TelegramBadRequest
+from handlers import keyboards
+from handlers.callbacks import BACK_TO_MODULES, MODULE, PAGE, on
+from content.index import get_content, get_module, get_submodule
 from data.database import update_user_progress
+from services.media import media_cache
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-BASE_DIR = Path(__file__).parent.parent
-IMAGES_DIR = BASE_DIR / "images"
+MODULE_SELECTION_TEXT = "📚 Выберите модуль для изучения:"
+
+def _is_not_modified(error: TelegramBadRequest) -> bool:
+    """Повторное нажатие той же кнопки: содержимое сообщения не изменилось"""
+    return "message is not modified" in str(error)
+
+async def show_text(
+    message: types.Message,
+    text: str,
+    reply_markup: types.InlineKeyboardMarkup,
+    parse_mode: Optional[str] = None
+):
+    """Показывает текст на месте сообщения: редактирует его, а если это фото
+    (фото нельзя превратить в текст) или правка невозможна — отправляет новое
+    сообщение и удаляет старое"""
+    if not message.photo:
+        try:
+            await message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+            return
+        except TelegramBadRequest as e:
+            if _is_not_modified(e):
+                return
+            logger.warning(f"Edit text failed, resending: {e}")
+    await message.answer(text, reply_markup=reply_markup, parse_mode=parse_mode)
+    await message.delete()
+
+async def show_photo(
+    message: types.Message,
+    image: str,
+    caption: str,
+    reply_markup: types.InlineKeyboardMarkup
+):
+    """Показывает картинку с подписью на месте сообщения: у фото меняется
+    медиа (edit_message_media), текстовое сообщение заменяется новым"""
+    if message.photo:
+        async def edit(photo):
+            try:
+                return await message.edit_media(
+                    types.InputMediaPhoto(media=photo, caption=caption, parse_mode="HTML"),
+                    reply_markup=reply_markup
+                )
+            except TelegramBadRequest as e:
+                # Та же картинка уже на экране: это не ошибка file_id
+                if _is_not_modified(e):
+                    return message
+                raise
+
+        try:
+            await media_cache.send(image, edit)
+            return
+        except TelegramBadRequest as e:
+            logger.warning(f"Edit media failed, resending: {e}")
+    await media_cache.send(
+        image,
+        lambda photo: message.answer_photo(
+            photo=photo,
+            caption=caption,
+            reply_markup=reply_markup,
+            parse_mode="HTML"
+        )
+    )
+    await message.delete()
 
 async def send_module_selection(message: types.Message):
     """Отправляет список модулей для выбора"""
     try:
-        builder = InlineKeyboardBuilder()
-        for module_id in range(1, get_total_modules() + 1):
-            module = get_module(module_id)
-            builder.add(types.InlineKeyboardButton(
-                text=module['title'],
-                callback_data=f"mod_{module_id}"
-            ))
-        builder.adjust(1)
         await message.answer(
-            "📚 Выберите модуль для изучения:",
-            reply_markup=builder.as_markup()
+            MODULE_SELECTION_TEXT,
+            reply_markup=keyboards.module_selection()
         )
     except Exception as e:
         logger.error(f"Error sending module selection: {e}")
@@ -40,24 +93,11 @@ async def send_submodule_selection(callback: types.CallbackQuery, module_id: int
             await callback.answer("Модуль не найден")
             return
 
-        builder = InlineKeyboardBuilder()
-        
-        # Вертикальное расположение кнопок подразделов
-        for sub_id, submodule in module['submodules'].items():
-            builder.row(types.InlineKeyboardButton(
-                text=submodule['title'],
-                callback_data=f"sub_{module_id}_{sub_id}_1"
-            ))
-        
-        # Кнопка "Назад" в отдельном ряду
-        builder.row(types.InlineKeyboardButton(
-            text="◀️ Назад к модулям",
-            callback_data="back_to_modules"
-        ))
-        
-        await callback.message.edit_text(
-            f"📖 Модуль: {module['title']}\n\nВыберите раздел:",
-            reply_markup=builder.as_markup()
+        # Со страницы теории сюда приходят и из сообщения с фото
+        await show_text(
+            callback.message,
+            f"📖 Модуль: {module.title}\n\nВыберите раздел:",
+            reply_markup=keyboards.submodule_selection(module_id)
         )
     except Exception as e:
         logger.error(f"Error sending submodule selection: {e}")
@@ -72,56 +112,40 @@ async def send_content_page(
     """Отправляет содержимое страницы"""
     try:
         content = get_content(module_id, submodule_id, page)
-        if not content or not content.get('text'):
+        if content is None:
             await callback.answer("⛔ Материал не найден")
             return
 
-        submodule = get_submodule(module_id, submodule_id)
-        total_pages = submodule.get('pages', 1)
+        total_pages = len(get_submodule(module_id, submodule_id).pages)
 
         # Навигационные кнопки
-        builder = InlineKeyboardBuilder()
-        if page > 1:
-            builder.add(types.InlineKeyboardButton(
-                text="⬅️ Назад",
-                callback_data=f"sub_{module_id}_{submodule_id}_{page-1}"
-            ))
-        if page < total_pages:
-            builder.add(types.InlineKeyboardButton(
-                text="Далее ➡️",
-                callback_data=f"sub_{module_id}_{submodule_id}_{page+1}"
-            ))
-        builder.row(types.InlineKeyboardButton(
-            text="📋 К списку тем",
-            callback_data=f"mod_{module_id}"
-        ))
-        builder.adjust(2)
-
-        # Отправка контента
-        if content.get('image'):
-            image_path = IMAGES_DIR / content['image']
+        markup = keyboards.page_navigation(module_id, submodule_id, page, total_pages)
+
+        # Страница показывается на месте текущего сообщения
+        if content.image:
             try:
-                await callback.message.answer_photo(
-                    photo=FSInputFile(image_path),
-                    caption=content['text'],
-                    reply_markup=builder.as_markup(),
-                    parse_mode="HTML"
+                await show_photo(
+                    callback.message,
+                    content.image,
+                    content.text,
+                    markup
                 )
             except Exception as e:
                 logger.warning(f"Image send failed: {e}")
-                await callback.message.answer(
-                    text=content['text'],
-                    reply_markup=builder.as_markup(),
+                await show_text(
+                    callback.message,
+                    content.text,
+                    markup,
                     parse_mode="HTML"
                 )
         else:
-            await callback.message.answer(
-                text=content['text'],
-                reply_markup=builder.as_markup(),
+            await show_text(
+                callback.message,
+                content.text,
+                markup,
                 parse_mode="HTML"
             )
 
-        await callback.message.delete()
         await update_user_progress(
             user_id=callback.from_user.id,
             module=module_id,
@@ -133,29 +157,30 @@ async def send_content_page(
         logger.error(f"Error sending content: {e}")
         await callback.answer("⚠️ Ошибка загрузки материала")
 
-@router.callback_query(F.data.startswith("mod_"))
-async def module_handler(callback: types.CallbackQuery):
+@on(MODULE)
+async def module_handler(callback: types.CallbackQuery, module_id: int):
     try:
-        module_id = int(callback.data.split("_")[1])
         await send_submodule_selection(callback, module_id)
     except Exception as e:
         logger.error(f"Module handler error: {e}")
         await callback.answer("⚠️ Ошибка обработки модуля")
 
-@router.callback_query(F.data.startswith("sub_"))
-async def submodule_handler(callback: types.CallbackQuery):
+@on(PAGE)
+async def submodule_handler(callback: types.CallbackQuery, module_id: int, submodule_id: int, page: int):
     try:
-        _, mod, sub, page = callback.data.split("_")
-        await send_content_page(callback, int(mod), int(sub), int(page))
+        await send_content_page(callback, module_id, submodule_id, page)
     except Exception as e:
         logger.error(f"Submodule handler error: {e}")
         await callback.answer("⚠️ Ошибка обработки раздела")
 
-@router.callback_query(F.data == "back_to_modules")
+@on(BACK_TO_MODULES)
 async def back_handler(callback: types.CallbackQuery):
     try:
-        await send_module_selection(callback.message)
-        await callback.message.delete()
+        await show_text(
+            callback.message,
+            MODULE_SELECTION_TEXT,
+            reply_markup=keyboards.module_selection()
+        )
     except Exception as e:
         logger.error(f"Back handler error: {e}")
         await callback.answer("⚠️ Ошибка возврата")
\ No newline at end of file
@@ -1,49 +1,135 @@
+# Первым: от этого импорта отсчитывается время запуска
+from services.startup import startup
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from handlers.commands import router as commands_router
-from handlers.menu import router as menu_router
-from handlers.theory import router as theory_router
-from data.database import init_db
-from handlers.tests import router as tests_router
-from handlers.practice import router as practice_router
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("bot.log"),
-        logging.StreamHandler()
-    ]
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+startup.mark("import aiogram")
+from content.index import load_index
+from data.database import (
+    init_db, open_pool, close_pool, start_write_buffer, stop_write_buffer
 )
+from data.backup import BackupJob
+from data.fsm_storage import SQLiteStorage
+from services.media import media_cache, course_images
+from services.mailbox import mailbox
+from services.outbound import outbound
+from services.broadcast import resume_broadcasts, stop_broadcasts
+from services.content_reload import ContentWatcher
+from config import (
+    BACKUP_DIR, BACKUP_INTERVAL_HOURS, BACKUP_KEEP, BACKUP_COMPRESS, MEDIA_PREWARM_CHAT_ID,
+    BOT_MODE, BOT_TOKEN, TELEGRAM_API_URL, CONTENT_RELOAD_INTERVAL, FSM_CACHE_SIZE, FSM_TTL_HOURS
+)
+
+startup.mark("import main.py (остальное)")
+
+# Роутеры в порядке проверки. handlers.callbacks - последним: один обработчик
+# всех нажатий inline-кнопок с таблицей действий
+ROUTERS = (
+    "handlers.commands",
+    "handlers.menu",
+    "handlers.theory",
+    "handlers.tests",
+    "handlers.practice",
+    "handlers.callbacks",
+)
+
+def setup_logging():
+    """Настройка логирования"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=[
+            logging.FileHandler("bot.log"),
+            logging.StreamHandler()
+        ]
+    )
+
+def build_dispatcher() -> Dispatcher:
+    """Диспетчер со всеми роутерами бота (используется и нагрузочным прогоном)"""
+    # Состояния FSM пишутся в базу при остановке диспетчера (до close_pool)
+    dp = Dispatcher(storage=SQLiteStorage(maxsize=FSM_CACHE_SIZE, ttl=FSM_TTL_HOURS * 3600))
+    # Обновления одного чата - по очереди, повторные нажатия схлопываются
+    dp.update.outer_middleware(mailbox)
+    for name in ROUTERS:
+        dp.include_router(startup.import_module(name).router)
+    return dp
 
 async def main():
+    backup_job = BackupJob(BACKUP_DIR, keep=BACKUP_KEEP, compress=BACKUP_COMPRESS)
+    content_watcher = ContentWatcher()
+    prewarm = None
     try:
-        bot = Bot(token="your_token")  #токен
-        dp = Dispatcher(storage=MemoryStorage())
-
-        # Регистрация роутеров
-        dp.include_router(commands_router)
-        dp.include_router(menu_router)
-        dp.include_router(theory_router)
-        dp.include_router(tests_router)
-        dp.include_router(practice_router)
+        session = None
+        if TELEGRAM_API_URL:
+            session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+        bot = Bot(token=BOT_TOKEN, session=session)
+        # Все исходящие запросы идут через планировщик с лимитами Telegram
+        bot.session.middleware(outbound)
+        with startup.step("build_dispatcher"):
+            dp = build_dispatcher()
+        # После роутеров: их модули регистрируют производные кэши индекса
+        # (клавиатуры), и они строятся здесь же. Битое содержимое курса
+        # останавливает запуск (ContentError)
+        with startup.step("load_index"):
+            load_index()
 
         # Инициализация БД
-        await init_db()
+        with startup.step("init_db"):
+            await init_db()
+        with startup.step("open_pool"):
+            await open_pool()
+            await start_write_buffer()
+        if BACKUP_DIR:
+            backup_job.start(BACKUP_INTERVAL_HOURS * 3600)
+
+        with startup.step("media_cache.load"):
+            await media_cache.load()
+        if MEDIA_PREWARM_CHAT_ID:
+            prewarm = asyncio.create_task(
+                media_cache.prewarm(bot, MEDIA_PREWARM_CHAT_ID, course_images())
+            )
+        if CONTENT_RELOAD_INTERVAL > 0:
+            if MEDIA_PREWARM_CHAT_ID:
+                # Новые картинки загружаются в Telegram сразу после обновления содержимого
+                content_watcher.on_reload = lambda index: media_cache.prewarm(
+                    bot, MEDIA_PREWARM_CHAT_ID, course_images()
+                )
+            content_watcher.start(CONTENT_RELOAD_INTERVAL)
+
+        with startup.step("resume_broadcasts"):
+            await resume_broadcasts(bot)
+
+        webhook = None
+        if BOT_MODE == "webhook":
+            # aiohttp-сервер нужен только в режиме webhook
+            webhook = startup.import_module("services.webhook")
+        startup.log()
 
-        logging.info("Бот запущен")
-        await dp.start_polling(bot)
+        logging.info(f"Бот запущен ({BOT_MODE})")
+        if webhook is not None:
+            await webhook.run_webhook(bot, dp)
+        else:
+            # getUpdates не работает, пока у бота установлен webhook
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
 
     except Exception as e:
         logging.error(f"Ошибка: {e}")
     finally:
+        if prewarm is not None:
+            prewarm.cancel()
+        await content_watcher.stop()
+        await stop_broadcasts()
+        await backup_job.stop()
+        await stop_write_buffer()
+        await close_pool()
         if 'bot' in locals():
             await bot.close()
         logging.info("Бот остановлен")
 
 if __name__ == "__main__":
+    setup_logging()
     asyncio.run(main())
 
@@ -0,0 +1,196 @@
+"""Рассылки по активным пользователям.
+
+Получатели читаются из базы постранично (iter_active_users) по возрастанию
+user_id и обрабатываются порциями. Результат доставки каждому получателю
+записывается в broadcast_deliveries, а после порции курсор рассылки
+сдвигается на ее последний user_id. После падения или перезапуска рассылка
+продолжается с курсора, уже записанные получатели пропускаются.
+
+Запросы рассылки помечены как массовые (services.outbound.bulk), поэтому
+интерактивные ответы пользователям обслуживаются раньше них.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+from config import BROADCAST_CONCURRENCY, BROADCAST_RATE
+from data.database import (
+    get_broadcast, get_broadcast_ids, get_delivered_users,
+    iter_active_users, record_broadcast_deliveries, set_broadcast_status
+)
+from services.outbound import TokenBucket, bulk
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastRunner:
+    """Отправка одной рассылки: не больше rate сообщений в секунду
+    и не больше concurrency запросов одновременно"""
+
+    def __init__(
+        self,
+        bot: Bot,
+        broadcast_id: int,
+        rate: float = BROADCAST_RATE,
+        concurrency: int = BROADCAST_CONCURRENCY,
+        chunk_size: int = 500,
+        record_interval: float = 1.0
+    ) -> None:
+        self.bot = bot
+        self.broadcast_id = broadcast_id
+        self.rate = rate
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.record_interval = record_interval
+        self.counts = {'sent': 0, 'blocked': 0, 'failed': 0, 'skipped': 0}
+        self.started: Optional[float] = None
+        self._bucket = TokenBucket(rate, 1)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._stopping = False
+        self._broadcast: Optional[dict] = None
+
+    def stop(self) -> None:
+        """Просит рассылку остановиться после текущих запросов (статус не меняется,
+        рассылка продолжится при следующем запуске)"""
+        self._stopping = True
+
+    def stats(self) -> Dict[str, float]:
+        """Счетчики текущего запуска и скорость отправки"""
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        processed = self.counts['sent'] + self.counts['blocked'] + self.counts['failed']
+        return {
+            **self.counts,
+            'elapsed': round(elapsed, 1),
+            'rate': round(processed / elapsed, 1) if elapsed else 0.0,
+        }
+
+    async def _send(self, user_id: int) -> Tuple[str, Optional[str]]:
+        try:
+            with bulk():
+                await self.bot.send_message(
+                    user_id,
+                    self._broadcast['text'],
+                    parse_mode=self._broadcast['parse_mode']
+                )
+            return 'sent', None
+        except TelegramForbiddenError as e:
+            # Пользователь заблокировал бота: повторять бессмысленно
+            return 'blocked', str(e)[:200]
+        except Exception as e:
+            return 'failed', str(e)[:200]
+
+    async def _deliver(self, user_id: int, results: List[tuple]) -> None:
+        async with self._semaphore:
+            if self._stopping:
+                return
+            await self._bucket.acquire()
+            status, error = await self._send(user_id)
+        self.counts[status] += 1
+        results.append((user_id, status, error, int(time.time())))
+
+    async def _run_chunk(self, chunk: List[int]) -> None:
+        delivered = await get_delivered_users(self.broadcast_id, chunk[0], chunk[-1])
+        self.counts['skipped'] += len(delivered)
+        results: List[tuple] = []
+        pending = {
+            asyncio.create_task(self._deliver(user_id, results))
+            for user_id in chunk if user_id not in delivered
+        }
+        # Пишем результаты по ходу порции, чтобы после сбоя не отправить их повторно
+        while pending:
+            _, pending = await asyncio.wait(pending, timeout=self.record_interval)
+            if results:
+                batch, results[:] = list(results), []
+                await record_broadcast_deliveries(self.broadcast_id, batch)
+        if not self._stopping:
+            await record_broadcast_deliveries(self.broadcast_id, [], cursor_user_id=chunk[-1])
+
+    async def run(self) -> Dict[str, float]:
+        """Отправляет рассылку с места остановки, возвращает stats()"""
+        self._broadcast = await get_broadcast(self.broadcast_id)
+        if self._broadcast is None or self._broadcast['status'] != 'running':
+            return self.stats()
+        self.started = time.monotonic()
+        logger.info(
+            f"Рассылка {self.broadcast_id}: старт с user_id > {self._broadcast['cursor_user_id']}"
+        )
+
+        recipients = iter_active_users(
+            self._broadcast['days'],
+            batch_size=self.chunk_size,
+            after_user_id=self._broadcast['cursor_user_id']
+        )
+        chunk: List[int] = []
+        try:
+            async for user_id in recipients:
+                chunk.append(user_id)
+                if len(chunk) >= self.chunk_size:
+                    await self._run_chunk(chunk)
+                    chunk = []
+                    logger.info(f"Рассылка {self.broadcast_id}: {self.stats()}")
+                if self._stopping:
+                    break
+            if chunk and not self._stopping:
+                await self._run_chunk(chunk)
+        finally:
+            await recipients.aclose()
+
+        if not self._stopping:
+            await set_broadcast_status(self.broadcast_id, 'done')
+        logger.info(
+            f"Рассылка {self.broadcast_id} "
+            f"{'приостановлена' if self._stopping else 'завершена'}: {self.stats()}"
+        )
+        return self.stats()
+
+
+_runners: Dict[int, Tuple[BroadcastRunner, asyncio.Task]] = {}
+
+
+def start_broadcast(bot: Bot, broadcast_id: int) -> BroadcastRunner:
+    """Запускает (или продолжает) рассылку в фоне"""
+    if broadcast_id in _runners:
+        return _runners[broadcast_id][0]
+    runner = BroadcastRunner(bot, broadcast_id)
+    task = asyncio.create_task(runner.run())
+
+    def finished(task: asyncio.Task) -> None:
+        _runners.pop(broadcast_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Рассылка {broadcast_id} завершилась с ошибкой: {task.exception()}")
+
+    task.add_done_callback(finished)
+    _runners[broadcast_id] = (runner, task)
+    return runner
+
+
+def get_runner(broadcast_id: int) -> Optional[BroadcastRunner]:
+    entry = _runners.get(broadcast_id)
+    return entry[0] if entry else None
+
+
+async def resume_broadcasts(bot: Bot) -> None:
+    """Продолжает рассылки, прерванные остановкой или падением бота"""
+    for broadcast_id in await get_broadcast_ids('running'):
+        start_broadcast(bot, broadcast_id)
+
+
+async def cancel_broadcast(broadcast_id: int) -> None:
+    """Отменяет рассылку: она больше не будет продолжена"""
+    await set_broadcast_status(broadcast_id, 'cancelled')
+    await stop_broadcasts([broadcast_id])
+
+
+async def stop_broadcasts(broadcast_ids: Optional[List[int]] = None) -> None:
+    """Останавливает запущенные рассылки, дожидаясь текущих запросов"""
+    entries = [
+        entry for broadcast_id, entry in list(_runners.items())
+        if broadcast_ids is None or broadcast_id in broadcast_ids
+    ]
+    for runner, _ in entries:
+        runner.stop()
+    # Ошибки рассылок уже записаны в лог колбэком задачи
+    await asyncio.gather(*(task for _, task in entries), return_exceptions=True)
@@ -0,0 +1,101 @@
+"""Перезагрузка содержимого курса без перезапуска бота.
+
+ContentWatcher раз в interval секунд сверяет время изменения и размер файлов
+content.index.SOURCES. Когда файлы изменились и перестали меняться (дописаны
+до конца), исходники читаются заново, индекс и производные кэши собираются в
+отдельном потоке и подменяют текущие одной ссылкой (content.index.publish).
+Если новое содержимое не проходит проверку, бот продолжает работать со
+старым, а ошибки пишутся в лог.
+"""
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Optional, Tuple
+
+from content.index import (
+    CONTENT_DIR, SOURCES, ContentError, ContentIndex, build_index, log_warnings, prepare,
+    publish, read_sources
+)
+
+logger = logging.getLogger(__name__)
+
+ReloadCallback = Callable[[ContentIndex], Awaitable[None]]
+
+
+def _compile() -> ContentIndex:
+    index = build_index(read_sources())
+    log_warnings(index)
+    return prepare(index)
+
+
+class ContentWatcher:
+    """Следит за файлами содержимого и перезагружает индекс на лету"""
+
+    def __init__(self, on_reload: Optional[ReloadCallback] = None) -> None:
+        self.on_reload = on_reload
+        self.reloads = 0
+        self._paths = [CONTENT_DIR / filename for filename, _ in SOURCES.values()]
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stop = asyncio.Event()
+
+    def _signature(self) -> Tuple:
+        signature = []
+        for path in self._paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    async def reload(self) -> bool:
+        """Пересобирает индекс из файлов; False, если содержимое с ошибками"""
+        async with self._lock:
+            try:
+                index = await asyncio.to_thread(_compile)
+            except ContentError as e:
+                logger.error(f"Содержимое не обновлено: {e}")
+                return False
+            publish(index)
+            self.reloads += 1
+            logger.info(f"Содержимое обновлено (модулей: {len(index.modules)})")
+        if self.on_reload is not None:
+            try:
+                await self.on_reload(index)
+            except Exception as e:
+                logger.warning(f"Ошибка после обновления содержимого: {e}")
+        return True
+
+    async def _watch(self, interval: float) -> None:
+        seen = self._signature()
+        pending = None
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=interval)
+                break
+            except asyncio.TimeoutError:
+                pass
+            current = self._signature()
+            if current == seen:
+                pending = None
+                continue
+            # Файл может еще дописываться: ждем, пока он не перестанет меняться
+            if current != pending:
+                pending = current
+                continue
+            seen, pending = current, None
+            # Битое содержимое не перечитывается до следующего изменения файлов
+            await self.reload()
+
+    def start(self, interval: float) -> None:
+        """Запускает проверку файлов в фоне"""
+        if self._task is None:
+            self._stop.clear()
+            self._task = asyncio.create_task(self._watch(interval))
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            self._stop.set()
+            await task
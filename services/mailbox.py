@@ -0,0 +1,161 @@
+"""Очередь входящих обновлений по чатам.
+
+UpdateMailbox - outer-middleware диспетчера (уровень Update):
+- обновления одного чата обрабатываются строго по очереди, в порядке прихода
+  (asyncio.Lock отдает блокировку ожидающим по порядку), разные чаты - параллельно;
+- одинаковые нажатия (та же кнопка той же версии сообщения) в пределах
+  duplicate_window секунд схлопываются: повтор только гасит "часики" на кнопке,
+  не запуская обработчик второй раз;
+- в очереди одного чата не больше max_queue обновлений, лишние отбрасываются;
+- одновременно выполняется не больше concurrency обработчиков на весь бот,
+  чтобы всплеск нагрузки не превращался во всплеск запросов к базе и Bot API;
+- stats() отдает длины очередей и счетчики отброшенных обновлений.
+
+Middleware подключается после FSM aiogram: raw_state читается до очереди,
+поэтому обработчики берут состояние из FSMContext внутри себя.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from aiogram import types
+from config import UPDATE_CHAT_QUEUE, UPDATE_CONCURRENCY, UPDATE_DUPLICATE_WINDOW
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[types.TelegramObject, Dict[str, Any]], Awaitable[Any]]
+
+
+class ChatMailbox:
+    """Очередь одного чата: блокировка и число обновлений в ней (с выполняемым)"""
+    __slots__ = ("lock", "size")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.size = 0
+
+
+class UpdateMailbox:
+    """Последовательная обработка обновлений каждого чата с общим лимитом параллельности"""
+
+    def __init__(self, concurrency: int = 64, max_queue: int = 10,
+                 duplicate_window: float = 1.0) -> None:
+        self.max_queue = max_queue
+        self.duplicate_window = duplicate_window
+        self.concurrency = concurrency
+        self._slots = asyncio.Semaphore(concurrency)
+        self._chats: Dict[int, ChatMailbox] = {}
+        # Ключ нажатия -> время прихода, в порядке прихода
+        self._recent: "OrderedDict[Hashable, float]" = OrderedDict()
+        self.waiting = 0
+        self.in_flight = 0
+        self.processed = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    @staticmethod
+    def _chat_id(data: Dict[str, Any]) -> Optional[int]:
+        chat = data.get("event_chat")
+        if chat is not None:
+            return chat.id
+        user = data.get("event_from_user")
+        return user.id if user is not None else None
+
+    @staticmethod
+    def _tap_key(chat_id: int, callback: types.CallbackQuery) -> Tuple:
+        """Нажатие кнопки в конкретной версии сообщения: повторное нажатие после
+        правки сообщения ботом (другой экран) повтором не считается"""
+        message = callback.message
+        if message is None:
+            return chat_id, callback.inline_message_id, callback.data
+        edit_date = getattr(message, "edit_date", None)
+        text = getattr(message, "text", None) or getattr(message, "caption", None)
+        return chat_id, message.message_id, edit_date, hash(text), callback.data
+
+    def _is_duplicate(self, key: Hashable) -> bool:
+        now = time.monotonic()
+        while self._recent:
+            oldest, seen = next(iter(self._recent.items()))
+            if now - seen < self.duplicate_window:
+                break
+            del self._recent[oldest]
+        if key in self._recent:
+            return True
+        self._recent[key] = now
+        return False
+
+    @staticmethod
+    async def _reject(event: types.Update) -> None:
+        """Гасит "часики" на кнопке отброшенного нажатия"""
+        if event.callback_query is None:
+            return
+        try:
+            await event.callback_query.answer()
+        except Exception as e:
+            logger.debug(f"Не удалось ответить на отброшенное нажатие: {e}")
+
+    async def __call__(self, handler: Handler, event: types.Update, data: Dict[str, Any]) -> Any:
+        chat_id = self._chat_id(data)
+        if chat_id is None:
+            async with self._slots:
+                return await handler(event, data)
+
+        if event.callback_query is not None and self._is_duplicate(
+            self._tap_key(chat_id, event.callback_query)
+        ):
+            self.duplicates += 1
+            await self._reject(event)
+            return None
+
+        mailbox = self._chats.get(chat_id)
+        if mailbox is None:
+            mailbox = self._chats[chat_id] = ChatMailbox()
+        if mailbox.size >= self.max_queue:
+            self.dropped += 1
+            logger.warning(f"Очередь чата {chat_id} переполнена, обновление {event.update_id} отброшено")
+            await self._reject(event)
+            return None
+
+        mailbox.size += 1
+        self.max_depth = max(self.max_depth, mailbox.size)
+        self.waiting += 1
+        waiting = True
+        try:
+            async with mailbox.lock, self._slots:
+                self.waiting -= 1
+                waiting = False
+                self.in_flight += 1
+                try:
+                    return await handler(event, data)
+                finally:
+                    self.in_flight -= 1
+                    self.processed += 1
+        finally:
+            # Отмена (остановка бота) могла застать обновление в очереди
+            if waiting:
+                self.waiting -= 1
+            mailbox.size -= 1
+            if mailbox.size == 0:
+                del self._chats[chat_id]
+
+    def stats(self) -> Dict[str, int]:
+        """Длины очередей и счетчики входящих обновлений"""
+        return {
+            "chats": len(self._chats),
+            "queued": self.waiting,
+            "in_flight": self.in_flight,
+            "max_depth": self.max_depth,
+            "processed": self.processed,
+            "duplicates": self.duplicates,
+            "dropped": self.dropped,
+        }
+
+
+mailbox = UpdateMailbox(
+    concurrency=UPDATE_CONCURRENCY,
+    max_queue=UPDATE_CHAT_QUEUE,
+    duplicate_window=UPDATE_DUPLICATE_WINDOW
+)
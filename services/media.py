@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple, Union
+
+from aiogram import Bot, types
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile
+from content.index import get_index
+from data.database import delete_media_file_id, load_media_file_ids, save_media_file_id
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent.parent
+IMAGES_DIR = BASE_DIR / "images"
+# Собранные content/build_images.py картинки и их манифест
+BUILD_DIR_NAME = "build"
+MANIFEST_NAME = "manifest.json"
+
+PhotoSender = Callable[[Union[str, FSInputFile]], Awaitable[types.Message]]
+
+# Фрагменты ответов Bot API на недействительный file_id
+# ("wrong file identifier/HTTP URL specified", "wrong remote file identifier
+# specified", "FILE_ID_INVALID" и т.п.)
+_BAD_FILE_ID_MARKERS = ("file identifier", "file_id", "file id")
+
+
+def _is_bad_file_id(error: Exception) -> bool:
+    """Telegram отклонил сам file_id (а не запрос целиком)"""
+    if not isinstance(error, TelegramBadRequest):
+        return False
+    message = error.message.lower()
+    return any(marker in message for marker in _BAD_FILE_ID_MARKERS)
+
+
+class MediaCache:
+    """Кэш file_id картинок курса.
+
+    Первая успешная отправка картинки загружает файл в Telegram, дальше
+    отправляется только file_id. Запись привязана к пути и sha256 содержимого:
+    если файл изменился, он будет загружен заново.
+
+    Если для картинки есть актуальная сборка в images/build (манифест
+    совпадает по sha256 исходника), отправляется она вместо оригинала."""
+
+    def __init__(self, images_dir: Path = IMAGES_DIR) -> None:
+        self.images_dir = images_dir
+        self._file_ids: Dict[str, Tuple[str, str]] = {}
+        # путь -> (mtime_ns, size, sha256), чтобы не перечитывать неизмененный файл
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}
+        self._manifest: Dict[str, dict] = {}
+        self._manifest_mtime: Optional[int] = None
+
+    async def load(self) -> None:
+        """Загружает сохраненные file_id из базы"""
+        self._file_ids = await load_media_file_ids()
+        logger.info(f"Кэш картинок: загружено file_id: {len(self._file_ids)}")
+
+    def content_hash(self, path: str) -> str:
+        stat = os.stat(self.images_dir / path)
+        known = self._hashes.get(path)
+        if known and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+            return known[2]
+        digest = hashlib.sha256((self.images_dir / path).read_bytes()).hexdigest()
+        self._hashes[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        """Манифест сборки; перечитывается, только если файл изменился"""
+        manifest_path = self.images_dir / BUILD_DIR_NAME / MANIFEST_NAME
+        try:
+            mtime = os.stat(manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            self._manifest, self._manifest_mtime = {}, None
+            return self._manifest
+        if mtime != self._manifest_mtime:
+            try:
+                self._manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            except ValueError as e:
+                logger.warning(f"Манифест картинок поврежден, используются оригиналы: {e}")
+                self._manifest = {}
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def resolve(self, path: str) -> str:
+        """Путь (относительно images_dir) файла, который нужно отправить:
+        собранная версия, если она соответствует исходнику, иначе оригинал"""
+        entry = self._load_manifest().get(path)
+        if entry:
+            built = f"{BUILD_DIR_NAME}/{entry['output']}"
+            if ((self.images_dir / built).exists()
+                    and entry['source_hash'] == self.content_hash(path)):
+                return built
+        return path
+
+    def file_id(self, path: str) -> Optional[str]:
+        """file_id актуальной версии файла или None"""
+        cached = self._file_ids.get(path)
+        if cached and cached[0] == self.content_hash(self.resolve(path)):
+            return cached[1]
+        return None
+
+    async def remember(self, path: str, message: Optional[types.Message]) -> None:
+        """Запоминает file_id из ответа Telegram на отправку картинки"""
+        if not isinstance(message, types.Message) or not message.photo:
+            return
+        file_id = message.photo[-1].file_id
+        content_hash = self.content_hash(self.resolve(path))
+        if self._file_ids.get(path) == (content_hash, file_id):
+            return
+        self._file_ids[path] = (content_hash, file_id)
+        await save_media_file_id(path, content_hash, file_id)
+
+    async def invalidate(self, path: str) -> None:
+        if self._file_ids.pop(path, None) is not None:
+            await delete_media_file_id(path)
+
+    async def send(self, path: str, send: PhotoSender) -> types.Message:
+        """Отправляет картинку через send(photo): по file_id, если он есть,
+        иначе загружает файл и запоминает полученный file_id"""
+        file_id = self.file_id(path)
+        if file_id is not None:
+            try:
+                return await send(file_id)
+            except TelegramBadRequest as e:
+                # file_id мог стать недействительным (например, сменился бот).
+                # Прочие ошибки (сеть, "message can't be edited") - не повод
+                # забывать file_id и загружать файл заново
+                if not _is_bad_file_id(e):
+                    raise
+                logger.warning(f"Cached file_id failed for {path}: {e}")
+                await self.invalidate(path)
+        message = await send(FSInputFile(self.images_dir / self.resolve(path)))
+        await self.remember(path, message)
+        return message
+
+    async def prewarm(self, bot: Bot, chat_id: int, paths: Iterable[str]) -> int:
+        """Загружает в Telegram еще не закэшированные картинки через служебный чат.
+        Возвращает число загруженных файлов."""
+        uploaded = 0
+        for path in sorted(set(paths)):
+            if self.file_id(path) is not None:
+                continue
+            try:
+                message = await self.send(
+                    path, lambda photo: bot.send_photo(chat_id, photo, disable_notification=True)
+                )
+                await bot.delete_message(chat_id, message.message_id)
+                uploaded += 1
+            except Exception as e:
+                logger.warning(f"Prewarm failed for {path}: {e}")
+            await asyncio.sleep(0.05)
+        logger.info(f"Кэш картинок: предварительно загружено {uploaded}")
+        return uploaded
+
+
+media_cache = MediaCache()
+
+
+def course_images() -> Iterable[str]:
+    """Все картинки, на которые ссылаются страницы курса"""
+    return [
+        page.image
+        for module in get_index().modules
+        for submodule in module.submodules
+        for page in submodule.pages if page.image
+    ]
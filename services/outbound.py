@@ -0,0 +1,258 @@
+"""Планировщик исходящих запросов к Bot API.
+
+Все запросы бота проходят через OutboundScheduler (middleware сессии aiogram):
+- общий токен-бакет ограничивает отправку во все чаты (~30 сообщений/с);
+- токен-бакет на каждый чат (~1 сообщение/с в личке, 20/мин в группах);
+- интерактивные ответы получают токен раньше массовых рассылок: рассылка
+  помечает свои запросы через `with bulk():`;
+- на 429 чат приостанавливается на retry_after, запрос повторяется
+  автоматически (до max_retries раз);
+- stats() отдает глубину очередей и счетчики для мониторинга.
+
+Лимиты касаются только новых сообщений с chat_id (LIMITED_METHODS). Правка
+и удаление сообщений - ответ на нажатие кнопки - идут без очереди, чтобы не
+добавлять ожидание к каждому нажатию: для них соблюдается только пауза чата
+после 429. sendChatAction, getUpdates, answerCallbackQuery и служебные
+вызовы тоже идут без очереди.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from config import OUTBOUND_CHAT_RATE, OUTBOUND_GLOBAL_RATE, OUTBOUND_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+_priority: ContextVar[int] = ContextVar("outbound_priority", default=INTERACTIVE)
+
+# Методы, создающие новые сообщения: на них распространяются лимиты Telegram.
+# sendChatAction ("печатает...") и черновики сообщений сюда не входят
+LIMITED_METHODS = frozenset({
+    "sendMessage", "sendPhoto", "sendAudio", "sendDocument", "sendVideo",
+    "sendAnimation", "sendVoice", "sendVideoNote", "sendMediaGroup", "sendPaidMedia",
+    "sendLocation", "sendVenue", "sendContact", "sendPoll", "sendChecklist",
+    "sendDice", "sendSticker", "sendInvoice", "sendGame",
+    "forwardMessage", "forwardMessages", "copyMessage", "copyMessages",
+})
+
+
+@contextmanager
+def bulk() -> Iterator[None]:
+    """Запросы внутри блока считаются массовыми и пропускают интерактивные вперед"""
+    token = _priority.set(BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Токен-бакет: rate токенов в секунду, не больше capacity в запасе.
+    Ожидающие обслуживаются по порядку."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def block(self, until: float) -> None:
+        """Не выдавать токены до момента until (time.monotonic)"""
+        self._blocked_until = max(self._blocked_until, until)
+        self._tokens = 0.0
+        self._updated = max(self._updated, until)
+
+    @property
+    def is_idle(self) -> bool:
+        """Бакет полон и никто не ждет: его можно забыть без потери состояния"""
+        now = time.monotonic()
+        if self._lock.locked() or now < self._blocked_until:
+            return False
+        self._refill(now)
+        return self._tokens >= self.capacity
+
+    def delay(self) -> float:
+        """Сколько ждать до следующего токена (0, если токен есть)"""
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    async def wait_unblocked(self) -> None:
+        """Ждет окончания паузы после 429, не расходуя токен"""
+        delay = self._blocked_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def take(self) -> bool:
+        if self.delay() == 0.0:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while not self.take():
+                await asyncio.sleep(self.delay())
+
+
+class PriorityTokenBucket(TokenBucket):
+    """Токен-бакет, выдающий токены по приоритету (меньше - раньше),
+    внутри одного приоритета - по порядку прихода"""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        super().__init__(rate, capacity)
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+
+    def depth(self) -> Dict[int, int]:
+        """Число ожидающих токен по приоритетам"""
+        result = dict.fromkeys(PRIORITY_NAMES, 0)
+        for priority, _, future in self._waiters:
+            if not future.done():
+                result[priority] = result.get(priority, 0) + 1
+        return result
+
+    async def acquire(self, priority: int = INTERACTIVE) -> None:
+        if not self._waiters and self.take():
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+        await future
+
+    async def _run(self) -> None:
+        while self._waiters:
+            _, _, future = self._waiters[0]
+            if future.done():  # ожидающий отменен
+                heapq.heappop(self._waiters)
+                continue
+            if self.take():
+                heapq.heappop(self._waiters)
+                future.set_result(None)
+            else:
+                await asyncio.sleep(self.delay())
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """Middleware сессии бота: очередь, лимиты Telegram и повтор после 429"""
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        group_rate: float = 20 / 60,
+        max_retries: int = 3,
+        max_chats: int = 10000
+    ) -> None:
+        self.global_bucket = PriorityTokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._chats: Dict[int, TokenBucket] = {}
+        self._chat_waiting = dict.fromkeys(PRIORITY_NAMES, 0)
+        self.sent = 0
+        self.retry_after = 0
+        self.failed = 0
+        self.wait_time = 0.0
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chats:
+                # Забываем полные бакеты: их состояние равно новому бакету
+                for idle_id in [cid for cid, b in self._chats.items() if b.is_idle]:
+                    del self._chats[idle_id]
+            if chat_id < 0:
+                bucket = TokenBucket(self.group_rate, self.chat_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat_id: int, priority: int, limited: bool) -> None:
+        started = time.monotonic()
+        self._chat_waiting[priority] += 1
+        try:
+            if limited:
+                await self._chat_bucket(chat_id).acquire()
+            else:
+                await self._chat_bucket(chat_id).wait_unblocked()
+        finally:
+            self._chat_waiting[priority] -= 1
+        if limited:
+            await self.global_bucket.acquire(priority)
+        self.wait_time += time.monotonic() - started
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if not isinstance(chat_id, int):
+            # Методы без чата (и @username каналов) не лимитируем
+            return await make_request(bot, method)
+
+        priority = _priority.get()
+        limited = method.__api_method__ in LIMITED_METHODS
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_id, priority, limited)
+            try:
+                result = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.retry_after += 1
+                self._chat_bucket(chat_id).block(time.monotonic() + e.retry_after)
+                logger.warning(
+                    f"429 for chat {chat_id} ({type(method).__name__}), "
+                    f"retry after {e.retry_after}s (attempt {attempt + 1})"
+                )
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    raise
+                continue
+            self.sent += 1
+            return result
+
+    def stats(self) -> Dict[str, float]:
+        """Глубина очередей и счетчики исходящих запросов"""
+        depth = self.global_bucket.depth()
+        result = {}
+        for priority, name in PRIORITY_NAMES.items():
+            result[f"queued_{name}"] = depth.get(priority, 0) + self._chat_waiting[priority]
+        result.update({
+            "chats": len(self._chats),
+            "sent": self.sent,
+            "retry_after": self.retry_after,
+            "failed": self.failed,
+            "avg_wait_ms": round(self.wait_time / self.sent * 1000, 1) if self.sent else 0.0,
+        })
+        return result
+
+
+outbound = OutboundScheduler(
+    global_rate=OUTBOUND_GLOBAL_RATE,
+    chat_rate=OUTBOUND_CHAT_RATE,
+    max_retries=OUTBOUND_MAX_RETRIES
+)
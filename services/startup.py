@@ -0,0 +1,69 @@
+"""Замер времени запуска бота.
+
+Модуль импортируется первым в main.py: от этого момента считается время
+запуска. Этапы (импорт модулей, init_db, сборка роутеров и т.д.) замеряются
+через step()/import_module(), report() перечисляет их с вложенностью.
+Время импорта модуля включает его еще не загруженные зависимости; подробная
+разбивка по всем модулям - python -X importtime main.py.
+"""
+import importlib
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfiler:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self._last = self.started
+        self._depth = 0
+        # (вложенность, этап, секунды)
+        self.steps: List[Tuple[int, str, float]] = []
+
+    def mark(self, name: str) -> None:
+        """Этап от предыдущей отметки до текущего момента"""
+        now = time.perf_counter()
+        self.steps.append((self._depth, name, now - self._last))
+        self._last = now
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        position = len(self.steps)
+        depth = self._depth
+        self._depth += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self._last = time.perf_counter()
+            # Вложенные этапы завершаются раньше, а показываются после родителя
+            self.steps.insert(position, (depth, name, self._last - started))
+
+    def import_module(self, name: str) -> ModuleType:
+        """Импортирует модуль, замеряя время первого импорта"""
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        with self.step(f"import {name}"):
+            return importlib.import_module(name)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def report(self) -> str:
+        lines = [f"Запуск: {self.elapsed() * 1000:.0f} мс"]
+        for depth, name, seconds in self.steps:
+            lines.append(f"{'  ' * (depth + 1)}{name}: {seconds * 1000:.1f} мс")
+        return "\n".join(lines)
+
+    def log(self) -> None:
+        logger.info(self.report())
+
+
+startup = StartupProfiler()
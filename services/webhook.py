@@ -0,0 +1,82 @@
+"""Прием обновлений через webhook (aiohttp).
+
+Telegram (или локальный тестовый Bot API) присылает обновления POST-запросом
+на WEBHOOK_PATH. Запрос проверяется по заголовку
+X-Telegram-Bot-Api-Secret-Token, сразу получает ответ 200, а обновление
+обрабатывается диспетчером в фоновой задаче. Так медленный обработчик не
+задерживает доставку следующих обновлений. GET /healthz - для проверок
+живости (systemd, docker, обратный прокси).
+
+На один бот - один процесс, как и в режиме polling: состояния FSM
+(data/fsm_storage.py), кэш и отложенная запись прогресса, очередь чатов
+и лимиты исходящих запросов живут в памяти процесса. Несколько процессов
+за балансировщиком видели бы устаревшие данные друг друга.
+"""
+import asyncio
+import logging
+import signal
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from config import WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_URL
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookHandler(SimpleRequestHandler):
+    """При остановке дожидается обновлений, которые еще обрабатываются в фоне"""
+
+    def __init__(self, *args, shutdown_timeout: float = 10.0, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.shutdown_timeout = shutdown_timeout
+
+    async def close(self) -> None:
+        tasks = set(self._background_feed_update_tasks)
+        if tasks:
+            logger.info(f"Webhook: ожидание обработки обновлений: {len(tasks)}")
+            _, pending = await asyncio.wait(tasks, timeout=self.shutdown_timeout)
+            if pending:
+                logger.warning(f"Webhook: не дождались обновлений: {len(pending)}")
+        await super().close()
+
+
+async def _healthz(request: web.Request) -> web.Response:
+    return web.Response(text="ok")
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher) -> None:
+    """Поднимает HTTP-сервер webhook, регистрирует его в Bot API и работает
+    до SIGINT/SIGTERM"""
+    if not WEBHOOK_URL or not WEBHOOK_SECRET:
+        raise RuntimeError("Для режима webhook нужны WEBHOOK_URL и WEBHOOK_SECRET")
+
+    app = web.Application()
+    WebhookHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(
+        app, path=WEBHOOK_PATH
+    )
+    app.router.add_get("/healthz", _healthz)
+    # Запуск/остановка диспетчера вместе с приложением (on_startup/on_shutdown)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        await bot.set_webhook(
+            WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types()
+        )
+        logger.info(f"Webhook: слушаю {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:  # Windows: остановка через KeyboardInterrupt
+                pass
+        await stop.wait()
+    finally:
+        await runner.cleanup()